@@ -0,0 +1,94 @@
+'''The numpy side of goggles' array viewer: picking the 2-D plane of an N-D
+array to show, formatting just the part of it that's on screen, and summary
+stats that don't need a full-size temporary (so they work on big memmaps).'''
+import numpy as np  # type: ignore
+
+# elements reduced at a time by stats()
+STATS_BLOCK = 1 << 22
+
+
+def plane(arr, row_axis, col_axis, index=()):
+    '''the 2-D view of arr along row_axis and col_axis, with the other axes
+       fixed at index (one entry per other axis, in axis order). 0-D and 1-D
+       arrays come back as a single column; col_axis is ignored for them.'''
+    if arr.ndim < 2:
+        return arr.reshape(-1, 1)
+    rest = iter(index)
+    p = arr[tuple(slice(None) if axis in (row_axis, col_axis) else next(rest)
+                  for axis in range(arr.ndim))]
+    return p.T if row_axis > col_axis else p
+
+
+def format_window(p, rows, cols):
+    '''str() of the elements of the 2-D array p in the given row and column
+       ranges, as a list of rows. Only that window is read, which matters
+       for memmaps.'''
+    window = np.asarray(p[rows.start:rows.stop, cols.start:cols.stop])
+    if window.dtype.kind == 'f':
+        return [[f'{v:.6g}' for v in row] for row in window.tolist()]
+    return [[str(v) for v in row] for row in window.tolist()]
+
+
+def _blocks(arr):
+    '''arr as views of at most about STATS_BLOCK elements each, split along
+       the leading axes. Reshaping to 1-D instead would copy a strided view
+       whole, and page in all of a memmap at once.'''
+    if arr.size <= STATS_BLOCK or arr.ndim == 0:
+        yield arr
+    elif arr.ndim == 1:
+        for start in range(0, arr.shape[0], STATS_BLOCK):
+            yield arr[start:start + STATS_BLOCK]
+    else:
+        rows = STATS_BLOCK // (arr.size // arr.shape[0])
+        if rows:
+            for start in range(0, arr.shape[0], rows):
+                yield arr[start:start + rows]
+        else:
+            for row in arr:
+                yield from _blocks(row)
+
+
+def stats(arr):
+    '''min, max, mean and NaN count of a numeric array (NaNs are left out of
+       the others), or None if there's nothing to summarize'''
+    if arr.size == 0 or arr.dtype.kind not in 'biuf':
+        return None
+    lo, hi, total, count, nans = None, None, 0.0, 0, 0
+    for block in _blocks(arr):
+        block = np.asarray(block)
+        if block.dtype.kind == 'f':
+            isnan = np.isnan(block)
+            n = int(np.count_nonzero(isnan))
+            if n:
+                nans += n
+                block = block[~isnan]
+            if block.size == 0:
+                continue
+        block_lo, block_hi = block.min(), block.max()
+        lo = block_lo if lo is None else min(lo, block_lo)
+        hi = block_hi if hi is None else max(hi, block_hi)
+        total += float(block.sum(dtype=np.float64))
+        count += block.size
+    return {'min': lo, 'max': hi, 'mean': total / count if count else None, 'nans': nans}
+
+
+def summary(arr, rows=20, cols=8):
+    '''a few lines of text about arr: its dtype and shape, stats() and the
+       top-left corner of its first 2-D plane. Only that corner is read
+       (besides what stats() reads), and nothing refers to arr afterwards.'''
+    lines = [f'{arr.dtype} array of shape {arr.shape}']
+    s = stats(arr)
+    if s is not None and s['mean'] is None:  # all NaN
+        lines.append(f"nans {s['nans']}")
+    elif s is not None:
+        lines.append(f"min {s['min']}  max {s['max']}  mean {s['mean']:.6g}  nans {s['nans']}")
+    if arr.size == 0:
+        return '\n'.join(lines)
+    p = plane(arr, 0, 1, (0,) * max(arr.ndim - 2, 0))
+    window = format_window(p, range(min(rows, p.shape[0])), range(min(cols, p.shape[1])))
+    width = max(len(v) for row in window for v in row)
+    more = '  ...' if p.shape[1] > cols else ''
+    lines.extend('  '.join(v.rjust(width) for v in row) + more for row in window)
+    if p.shape[0] > rows:
+        lines.append('...')
+    return '\n'.join(lines)
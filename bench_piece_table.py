@@ -0,0 +1,143 @@
+'''Replays random edits against the flat-list piece table that PieceTable
+used to be and against the current tree-backed one.
+
+    python bench_piece_table.py [n_edits] [initial_size]
+'''
+import random
+import sys
+import time
+from piece_table import PieceTable
+
+
+# the original list-based implementation, kept here as a baseline
+class ListPiece:
+    __slots__ = ('type', 'offset', 'length')
+    def __init__(self, ty, offset, length):
+        self.type, self.offset, self.length = ty, offset, length
+
+
+class ListPieceTable:
+    def __init__(self, original):
+        self.original = original
+        self._add = ""
+        self._table = [ListPiece('original', 0, len(original))]
+
+    def _piece_index(self, buffer_offset) -> int:
+        '''returns piece index and offset into the pieces buffer'''
+        if buffer_offset < 0:
+            raise ValueError('out of bounds')
+
+        remaining_offset = buffer_offset
+        for i, piece in enumerate(self._table):
+            if remaining_offset <= piece.length:
+                return i, piece.offset + remaining_offset
+            remaining_offset -= piece.length
+
+        raise ValueError('out of bounds')
+
+    def insert(self, s, offset):
+        if not s:
+            return
+
+        add_offset = len(self._add)
+        self._add += s
+
+        i, buf_offset = self._piece_index(offset)
+        piece = self._table[i]
+
+        if piece.type == 'add' and buf_offset == piece.offset + piece.length and piece.offset + piece.length == add_offset:
+            piece.length += len(s)
+            return
+
+        new_pieces = [x for x in (
+            ListPiece(piece.type, piece.offset, buf_offset - piece.offset),
+            ListPiece('add', add_offset, len(s)),
+            ListPiece(piece.type, buf_offset, piece.length - (buf_offset - piece.offset))
+            ) if x.length > 0]
+
+        self._table = self._table[:i] + new_pieces + self._table[i+1:]
+
+    def delete(self, offset, length):
+        if length == 0:
+            return
+
+        if offset < 0:
+            raise ValueError('out of bounds')
+
+        i, i_buf_offset = self._piece_index(offset)
+        j, j_buf_offset = self._piece_index(offset + length)
+
+        if i == j:
+            piece = self._table[i]
+            if i_buf_offset == piece.offset:
+                piece.offset += length
+                piece.length -= length
+                return
+
+            if j_buf_offset == piece.offset + piece.length:
+                piece.length -= length
+                return
+
+        delete_pieces = [x for x in (
+            ListPiece(self._table[i].type, self._table[i].offset, i_buf_offset - self._table[i].offset),
+            ListPiece(self._table[j].type, j_buf_offset, self._table[j].length - (j_buf_offset - self._table[j].offset))
+            ) if x.length > 0]
+
+        self._table = self._table[:i] + delete_pieces + self._table[j+1:]
+
+        # if the table is empty, put a 0-length piece in there so we have at least one piece.
+        if not self._table:
+            self._table = [ListPiece('original', 0, 0)]
+
+    def as_str(self):
+        s = ""
+        for piece in self._table:
+            if piece.type == 'add':
+                s += self._add[piece.offset:piece.offset+piece.length]
+            elif piece.type == 'original':
+                s += self.original[piece.offset:piece.offset+piece.length]
+        return s
+
+
+
+def make_edits(n, initial_size, seed=0):
+    rng = random.Random(seed)
+    length = initial_size
+    edits = []
+    for _ in range(n):
+        if length and rng.random() < 0.4:
+            offset = rng.randrange(length)
+            n_deleted = min(rng.randint(1, 8), length - offset)
+            edits.append(('delete', offset, n_deleted))
+            length -= n_deleted
+        else:
+            s = ''.join(rng.choice('abcdef \n') for _ in range(rng.randint(1, 8)))
+            edits.append(('insert', rng.randint(0, length), s))
+            length += len(s)
+    return edits
+
+
+def replay(table, edits):
+    start = time.perf_counter()
+    for op, offset, arg in edits:
+        if op == 'insert':
+            table.insert(arg, offset)
+        else:
+            table.delete(offset, arg)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    initial_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    original = ''.join(random.Random(1).choice('abcdef \n') for _ in range(initial_size))
+    edits = make_edits(n, initial_size)
+
+    results = {}
+    for cls in (ListPieceTable, PieceTable):
+        table = cls(original)
+        elapsed = replay(table, edits)
+        results[cls.__name__] = table.as_str()
+        print(f'{cls.__name__:>16}: {n} edits in {elapsed:.2f}s ({elapsed / n * 1e6:.1f}us/edit)')
+
+    assert results['ListPieceTable'] == results['PieceTable']
@@ -0,0 +1,39 @@
+'''Measures how much CPU the workbench burns while it sits idle.
+
+    python bench_workbench_idle.py [seconds] [warmup seconds]
+
+Starts workbench.py, waits for it to finish starting up, then samples its CPU
+time from /proc (so Linux only) over a window where nothing happens.
+'''
+import os
+import subprocess
+import sys
+import time
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        # skip past the command name, which can contain spaces
+        fields = f.read().rsplit(')', 1)[1].split()
+    # utime and stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    warmup = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workbench.py')])
+    try:
+        time.sleep(warmup)
+        if proc.poll() is not None:
+            sys.exit(f'workbench exited during warmup with {proc.returncode}')
+
+        cpu_start, wall_start = cpu_seconds(proc.pid), time.perf_counter()
+        time.sleep(seconds)
+        cpu, wall = cpu_seconds(proc.pid) - cpu_start, time.perf_counter() - wall_start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f'idle for {wall:.1f}s: {cpu:.2f}s of CPU ({cpu / wall * 100:.1f}% of a core)')
@@ -1,45 +1,111 @@
 from piece_table import PieceTable
-import bisect
+import search
 
 
 class Buffer:
     def __init__(self, s):
         self._buf = PieceTable(s)
-        self._update_line_starts(s)
 
-    def _update_line_starts(self, s):
-        self._linestarts = [0] + [i+1 for i,
-                                  c in enumerate(s) if c == '\n']
+    @classmethod
+    def from_file(cls, path):
+        b = cls.__new__(cls)
+        b._buf = PieceTable.from_file(path)
+        return b
+
+    def close(self): self._buf.close()
 
     def as_str(self): return self._buf.as_str()
 
+    def __len__(self): return len(self._buf)
+
+    @property
+    def version(self): return self._buf.version
+
+    def substr(self, start, end): return self._buf.substr(start, end)
+
+    def iter_chunks(self, start=0, end=None): return self._buf.iter_chunks(start, end)
+
     def nlines(self):
-        return len(self._linestarts)
+        return self._buf.newline_count() + 1
 
-    # TODO: add selection for substring
-    # TODO: add iterlines
+    def line_text(self, n):
+        '''text of line n without its trailing newline'''
+        start = self.pos_for_line(n)
+        return self.substr(start, start + self.line_length(n) - 1)
+
+    def iter_lines(self, start_line=0, end_line=None):
+        '''lazily yields the text of lines [start_line, end_line) without
+           their trailing newlines'''
+        nlines = self.nlines()
+        end_line = nlines if end_line is None else min(end_line, nlines)
+        if start_line >= end_line:
+            return
+
+        start = self.pos_for_line(start_line)
+        end = self.pos_for_line(end_line) - 1 if end_line < nlines else len(self)
+        partial = []
+        for chunk in self.iter_chunks(start, end):
+            *complete, rest = chunk.split('\n')
+            for l in complete:
+                partial.append(l)
+                yield ''.join(partial)
+                partial = []
+            partial.append(rest)
+        yield ''.join(partial)
 
     def line(self, pos):
-        return bisect.bisect_right(self._linestarts, pos) - 1
+        return self._buf.newlines_before(pos)
 
     def pos_for_line(self, n):
-        assert 0 <= n < len(self._linestarts), n
-        return self._linestarts[n]
+        assert 0 <= n < self.nlines(), n
+        if n == 0:
+            return 0
+        return self._buf.newline_offset(n - 1) + 1
 
     def col(self, pos):
-        return pos - self._linestarts[bisect.bisect_right(self._linestarts, pos) - 1]
+        return pos - self.pos_for_line(self.line(pos))
 
     def line_length(self, n):
-        if n+1 < len(self._linestarts):
-            return self._linestarts[n+1] - self._linestarts[n]
+        if n+1 < self.nlines():
+            return self.pos_for_line(n+1) - self.pos_for_line(n)
         else:
-            # FIXME: once substr is added, get the length of the last line directly
-            return len(self.as_str()) - self._linestarts[n] + 1
+            return len(self._buf) - self.pos_for_line(n) + 1
 
     def insert(self, val, pos):
         self._buf.insert(val, pos)
-        self._update_line_starts(self.as_str())
 
     def delete(self, pos, length):
         self._buf.delete(pos, length)
-        self._update_line_starts(self.as_str())
+
+    def replace(self, start, end, val): self._buf.replace(start, end, val)
+
+    def replace_ranges(self, ranges): self._buf.replace_ranges(ranges)
+
+    def replace_all(self, old, new):
+        '''replaces every occurrence of old with new, returning how many there were'''
+        if not old:
+            raise ValueError('empty search string')
+        s = self.as_str()
+        ranges = []
+        i = s.find(old)
+        while i != -1:
+            ranges.append((i, i + len(old), new))
+            i = s.find(old, i + len(old))
+        self.replace_ranges(ranges)
+        return len(ranges)
+
+    def search(self, pattern, regex=False, flags=0, start=0, end=None):
+        '''lazily yields (start, end) for each match, see search.finditer'''
+        return search.finditer(self, pattern, regex, flags, start, end)
+
+    def add_listener(self, fn): self._buf.add_listener(fn)
+
+    def remove_listener(self, fn): self._buf.remove_listener(fn)
+
+    def batch(self): return self._buf.batch()
+
+    def apply_edits(self, edits): return self._buf.apply_edits(edits)
+
+    def undo(self): return self._buf.undo()
+
+    def redo(self): return self._buf.redo()
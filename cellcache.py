@@ -0,0 +1,240 @@
+'''Caches cell results, so a rerun that opts in (reuse=True) of a cell whose
+code and inputs haven't changed returns straight away instead of executing
+it again -- e.g. the cells downstream of one that was run again but came out
+the same. Every run is recorded, but a plain run always executes: cells
+aren't necessarily pure.
+
+A run is keyed by a hash of
+  * the cell's AST, so whitespace, comments and line numbers don't matter,
+  * the versions of the names it reads before defining them itself,
+  * the files (mtime and size) behind the modules it imports, and the ones
+    they import in turn if module_deps is given (e.g. a reloader.ModuleGraph's
+    imports), so reloading a module a cell only imports indirectly counts.
+A name's version is a hash of its value when that's small and picklable,
+so running a cell again and getting the same values doesn't invalidate the
+cells that read them. Otherwise it identifies the run that defined it, and
+every fresh run invalidates its readers. A hit restores the versions of the
+run it came from, so it puts back exactly the values a dependent's key was
+computed from. (Mutating a value in place doesn't change its version.)
+
+A hit restores the result and the names the cell defines, but not other side
+effects -- output, files written. Entries hold the objects themselves, so
+aliasing survives a hit, and so does anything mutated in place since.
+
+Entries are evicted least recently used once their (estimated) sizes add up
+to more than max_bytes; anything bigger than that isn't kept at all. With a
+path they're also pickled there and read back on a miss, so they outlive the
+process.'''
+import collections
+import hashlib
+import importlib
+import importlib.util
+import io
+import itertools
+import os
+import pickle
+import sys
+import types
+
+
+class _Pickler(pickle.Pickler):
+    # modules are stored by name and imported again on load
+    def persistent_id(self, obj):
+        if isinstance(obj, types.ModuleType):
+            return obj.__name__
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return importlib.import_module(pid)
+
+
+def _dumps(obj):
+    f = io.BytesIO()
+    _Pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return f.getvalue()
+
+
+def _loads(data):
+    return _Unpickler(io.BytesIO(data)).load()
+
+
+# _estimate_size gives up after looking at this many objects
+_MAX_OBJECTS = 10000
+
+# values up to this big get their contents hashed for their version
+FINGERPRINT_BYTES = 1 << 20
+
+
+def _estimate_size(obj, limit, seen=None):
+    '''roughly how many bytes obj and what it refers to take up, without
+       copying anything. Gives up and returns something over limit as soon
+       as it gets there, or once it's looked at _MAX_OBJECTS objects.'''
+    if seen is None:
+        seen = set()
+    if len(seen) >= _MAX_OBJECTS:
+        return limit + 1
+    if id(obj) in seen or isinstance(obj, (types.ModuleType, type, types.FunctionType)):
+        return 0
+    seen.add(id(obj))
+    nbytes = getattr(obj, 'nbytes', None)  # numpy arrays and the like
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, complex, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        children = itertools.chain.from_iterable(obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = iter(obj)
+    else:
+        d = getattr(obj, '__dict__', None)
+        children = iter(d.values()) if isinstance(d, dict) else iter(())
+    for child in children:
+        size += _estimate_size(child, limit - size, seen)
+        if size > limit:
+            break
+    return size
+
+
+def _fingerprint(value):
+    '''a hash of value's contents, or None if it's too big or can't be
+       pickled'''
+    if _estimate_size(value, FINGERPRINT_BYTES) > FINGERPRINT_BYTES:
+        return None
+    try:
+        return hashlib.sha256(_dumps(value)).hexdigest()
+    except Exception:
+        return None
+
+
+def _module_stamp(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        path = getattr(module, '__file__', None)
+    else:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        path = spec.origin if spec is not None and spec.has_location else None
+    try:
+        st = os.stat(path)
+    except (TypeError, OSError):
+        return name, None
+    return name, path, st.st_mtime_ns, st.st_size
+
+
+class CellCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None, module_deps=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.module_deps = module_deps
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._entries = collections.OrderedDict()  # key -> (result, values, versions, size)
+        self._size = 0
+        self._versions = {}  # name -> version of its value, see above
+        self._runs = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        '''estimated bytes held in memory'''
+        return self._size
+
+    def key(self, code, namespace, salt=None):
+        '''code is a cellcode.Code. salt is anything else (repr-able) the
+           result depends on.'''
+        h = hashlib.sha256(code.digest.encode())
+        if salt is not None:
+            h.update(repr(salt).encode())
+        for name in sorted(code.inputs):
+            version = self._versions.get(name) if name in namespace else None
+            h.update(repr((name, version)).encode())
+        modules = set(code.imports)
+        if self.module_deps is not None:
+            modules = self.module_deps(modules)
+        for name in sorted(modules):
+            h.update(repr(_module_stamp(name)).encode())
+        return h.hexdigest()
+
+    def run(self, code, namespace, execute, salt=None, reuse=False):
+        '''the result of execute(), which runs code in namespace. With reuse,
+           an earlier run of the same code on the same inputs can stand in
+           for it, in which case the names it defined are put back into
+           namespace instead.'''
+        key = self.key(code, namespace, salt)
+        entry = self._get(key) if reuse else None
+        if entry is not None:
+            result, values, versions, _ = entry
+            namespace.update(values)
+        else:
+            result = execute()
+            values = {name: namespace[name] for name in code.defines if name in namespace}
+            run = f'{key}:{os.getpid()}:{next(self._runs)}'
+            versions = {}
+            for name in code.defines:
+                fingerprint = _fingerprint(values[name]) if name in values else None
+                # without one, the value may differ from an earlier run's,
+                # so whatever reads it has to run again too
+                versions[name] = '=' + fingerprint if fingerprint is not None else run
+            self._put(key, result, values, versions)
+        self._versions.update(versions)
+        return result
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                result, values, versions = _loads(f.read())
+        except FileNotFoundError:
+            return None
+        size = _estimate_size((result, values), self.max_bytes)
+        if size > self.max_bytes:
+            return None
+        return self._remember(key, (result, values, versions, size))
+
+    def _put(self, key, result, values, versions):
+        # sized up before anything's copied, too big and it's not kept
+        size = _estimate_size((result, values), self.max_bytes)
+        if size > self.max_bytes:
+            return
+        self._remember(key, (result, values, versions, size))
+        if self.path is not None:
+            try:
+                data = _dumps((result, values, versions))
+            except Exception:
+                # functions and classes defined in cells, open files, ...
+                # just don't get written out
+                return
+            tmp = self._file(key) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._file(key))
+
+    def _remember(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[3]
+        self._entries[key] = entry
+        self._size += entry[3]
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted[3]
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,61 @@
+'''Compiled cells, shared by both front ends.
+
+Compiling a cell, and working out what it defines and reads, only depends on
+its source, so it's done once per distinct source and reused by every later
+run -- which is most runs when cells are rerun because a file changed.'''
+import ast
+import functools
+import hashlib
+import types
+from typing import NamedTuple, Optional
+from dataflow import cell_inputs, cell_symbols
+
+
+class Code(NamedTuple):
+    '''Everything derived from a cell's source. These are shared between
+       runs, so nothing may modify tree.'''
+    tree: ast.Module
+    body: types.CodeType  # every statement but a trailing expression
+    last: Optional[types.CodeType]  # the trailing expression, evaluated for the result
+    digest: str  # of the AST, so formatting and comments don't change it
+    defines: frozenset
+    inputs: frozenset  # see dataflow.cell_inputs
+    imports: tuple  # absolute names of the modules it imports
+    filename: str  # it's compiled under, one per source and cell so samples map back
+
+
+def _imported_modules(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            yield from (alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            yield node.module
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_cell(source, cell=None):
+    '''raises SyntaxError. cell (anything with a repr) goes in the filename,
+       to tell apart cells with the same source.'''
+    tree = ast.parse(source, mode='exec')
+    h = hashlib.sha256(source.encode()).hexdigest()[:12]
+    filename = f'<cell {h}>' if cell is None else f'<cell {cell!r} {h}>'
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        body = compile(ast.Module(tree.body[:-1], type_ignores=[]), filename, mode='exec')
+        last = compile(ast.Expression(tree.body[-1].value), filename, mode='eval')
+    else:
+        body = compile(tree, filename, mode='exec')
+        last = None
+    defines, _ = cell_symbols(source)
+    return Code(tree, body, last,
+                hashlib.sha256(ast.dump(tree).encode()).hexdigest(),
+                defines, cell_inputs(tree),
+                tuple(sorted(set(_imported_modules(tree)))), filename)
+
+
+def exec_block(code, context_globals, context_locals=None):
+    '''runs a compiled cell, returning the value of its trailing expression
+       (or None if it doesn't end in one)'''
+    exec(code.body, context_globals, context_locals)
+    if code.last is not None:
+        return eval(code.last, context_globals, context_locals)
+    return None
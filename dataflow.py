@@ -0,0 +1,170 @@
+'''Tracks which names each cell defines and which it reads, so that after a
+change only the cells downstream of it rerun, in dependency order.
+
+A cell reads a name if it, or a function/class/comprehension inside it,
+refers to it as a global without defining it itself. Names nobody defines
+(builtins, typos) just don't add any edges.'''
+import ast
+import heapq
+import itertools
+import symtable
+
+
+def _global_reads(table, out):
+    for child in table.get_children():
+        for sym in child.get_symbols():
+            if sym.is_global() and sym.is_referenced():
+                out.add(sym.get_name())
+        _global_reads(child, out)
+
+
+def cell_symbols(source):
+    '''(defines, reads) for a cell's source, where reads includes names the
+       cell defines too (e.g. x in x += 1). Raises SyntaxError.'''
+    table = symtable.symtable(source, '<cell>', 'exec')
+    defines = set()
+    reads = set()
+    for sym in table.get_symbols():
+        if sym.is_assigned() or sym.is_imported():
+            defines.add(sym.get_name())
+        if sym.is_referenced():
+            reads.add(sym.get_name())
+    _global_reads(table, reads)
+    # symtable doesn't count the target of x += 1 as referenced
+    reads |= {node.target.id for node in ast.walk(ast.parse(source))
+              if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name)}
+    return frozenset(defines), frozenset(reads)
+
+
+def cell_names(source):
+    '''(defines, reads) for a cell's source, without the names it reads
+       from itself. Raises SyntaxError.'''
+    defines, reads = cell_symbols(source)
+    return defines, reads - defines
+
+
+def cell_inputs(tree):
+    '''the names a parsed cell reads before defining them itself, i.e. the
+       ones its result can depend on. x is one in x += 1 but not in
+       x = 1; x * 2.'''
+    inputs = set()
+    defined = set()
+    for stmt in tree.body:
+        defines, reads = cell_symbols(ast.unparse(stmt))
+        inputs |= reads - defined
+        defined |= defines
+    return frozenset(inputs)
+
+
+class DependencyGraph:
+    '''Cells are identified by any hashable key. There's an edge from cell a
+       to cell b when b reads a name a defines.'''
+
+    def __init__(self):
+        self._cells = {}  # key -> (source, defines, reads)
+
+    def __contains__(self, key):
+        return key in self._cells
+
+    def set_cell(self, key, source):
+        '''updates key's names from its source. Returns the names it used to
+           define but doesn't anymore.'''
+        old = self._cells.get(key)
+        if old is not None and old[0] == source:
+            return frozenset()
+        defines, reads = cell_names(source)
+        self._cells[key] = (source, defines, reads)
+        return old[1] - defines if old is not None else frozenset()
+
+    def remove(self, key):
+        del self._cells[key]
+
+    def defines(self, key):
+        return self._cells[key][1]
+
+    def reads(self, key):
+        return self._cells[key][2]
+
+    def _readers(self):
+        by_name = {}
+        for key, (_, _, reads) in self._cells.items():
+            for name in reads:
+                by_name.setdefault(name, []).append(key)
+        return by_name
+
+    def dependents(self, changed, names=()):
+        '''changed plus every cell that (transitively) reads something they
+           define, or reads one of names'''
+        by_name = self._readers()
+        seen = set(changed)
+        stack = list(changed)
+        for name in names:
+            stack.extend(k for k in by_name.get(name, ()) if k not in seen)
+            seen.update(by_name.get(name, ()))
+        while stack:
+            key = stack.pop()
+            for name in self._cells[key][1] if key in self._cells else ():
+                for reader in by_name.get(name, ()):
+                    if reader not in seen:
+                        seen.add(reader)
+                        stack.append(reader)
+        return seen
+
+    def schedule(self, changed, names=(), order=None):
+        '''the cells to rerun after changed changed (and names were
+           removed), sorted so every cell runs after the cells it reads from.
+           order(key) breaks ties -- normally the cell's position in the
+           notebook -- and places cells that depend on each other in a
+           cycle. Defaults to the order cells were added.'''
+        if order is None:
+            position = {key: i for i, key in enumerate(self._cells)}
+            order = lambda key: position.get(key, len(position))
+        affected = self.dependents(changed, names)
+
+        indegree = dict.fromkeys(affected, 0)
+        edges = {key: [] for key in affected}
+        by_name = self._readers()
+        for key in affected:
+            if key not in self._cells:
+                continue
+            for name in self._cells[key][1]:
+                for reader in by_name.get(name, ()):
+                    if reader in affected and reader != key:
+                        edges[key].append(reader)
+                        indegree[reader] += 1
+
+        result = []
+        tiebreak = itertools.count()  # keys needn't be comparable
+        ready = [(order(k), next(tiebreak), k) for k in affected if indegree[k] == 0]
+        heapq.heapify(ready)
+        while ready:
+            _, _, key = heapq.heappop(ready)
+            result.append(key)
+            for reader in edges[key]:
+                indegree[reader] -= 1
+                if indegree[reader] == 0:
+                    heapq.heappush(ready, (order(reader), next(tiebreak), reader))
+        # whatever's left is stuck on a cycle, run it in notebook order
+        result.extend(sorted((k for k in affected if indegree[k] > 0), key=order))
+        return result
+
+
+def rerun(graph, changed, source, namespace, execute, order=None):
+    '''runs the changed cells and then the cells that read what they define,
+       in dependency order, as execute(cell, reuse). reuse is False for the
+       changed cells, which were asked for, and True for the rest, which only
+       run because of them (so they can come from a cellcache.CellCache).
+       source(cell) is a changed cell's new source. Names a changed cell
+       stopped defining are taken out of namespace first, so its readers
+       don't see them linger.'''
+    changed = set(changed)
+    removed = set()
+    for cell in changed:
+        try:
+            removed |= graph.set_cell(cell, source(cell))
+        except SyntaxError:
+            pass  # shows up when the cell runs
+    for name in removed:
+        namespace.pop(name, None)
+    for cell in graph.schedule(changed, removed, order=order):
+        execute(cell, cell not in changed)
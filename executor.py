@@ -0,0 +1,105 @@
+'''Runs cells on a background thread, so a long computation doesn't freeze
+the UI that started it.'''
+import concurrent.futures
+import ctypes
+import threading
+
+
+class CellExecutor:
+    '''Runs cells one at a time on a worker thread -- they share a namespace,
+       so running them concurrently would race.
+
+       on_event(key, event, value) is called from the worker thread with
+       event 'started' (value None) when a run starts and 'done' (value is
+       whatever run returned) or 'error' (value is the exception) when it
+       finishes.
+
+       interrupt_running, if given, is called to stop a run that has already
+       started instead of raising KeyboardInterrupt in the worker thread --
+       e.g. when run is waiting on another process.'''
+
+    def __init__(self, run, on_event, interrupt_running=None):
+        self._run = run
+        self._on_event = on_event
+        self._interrupt_running = interrupt_running
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='cell')
+        # reentrant, since cancelling a future runs its done callbacks right away
+        self._lock = threading.RLock()
+        self._jobs = {}  # key -> Future
+        self._running = None  # (key, thread id)
+        # keys interrupted after their future started but before _job got going
+        self._interrupted = set()
+
+    def submit(self, key, *args):
+        '''queues run(*args) for key. A queued run of the same key that hasn't
+           started yet is dropped in favour of this one.'''
+        with self._lock:
+            queued = self._jobs.get(key)
+            if queued is not None:
+                queued.cancel()
+            future = self._pool.submit(self._job, key, args)
+            self._jobs[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+
+    def _job(self, key, args):
+        with self._lock:
+            self._running = (key, threading.get_ident())
+            interrupted = key in self._interrupted
+            self._interrupted.discard(key)
+        try:
+            try:
+                if interrupted:
+                    raise KeyboardInterrupt
+                self._on_event(key, 'started', None)
+                event, value = 'done', self._run(*args)
+            finally:
+                with self._lock:
+                    self._running = None
+        except BaseException as e:  # including the KeyboardInterrupt from interrupt()
+            event, value = 'error', e
+        self._on_event(key, event, value)
+
+    def status(self, key):
+        '''"running", "queued" or None'''
+        with self._lock:
+            if self._running is not None and self._running[0] == key:
+                return 'running'
+            if key in self._jobs:
+                return 'queued'
+        return None
+
+    def interrupt(self, key):
+        '''drops a queued run of key, or raises KeyboardInterrupt inside it if
+           it's running. The exception is only delivered once the thread is
+           back to running Python code, so a long call into C (e.g. a big
+           numpy operation) finishes first. Returns whether there was anything
+           to stop.'''
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and future.cancel():
+                return True
+            if self._running is not None and self._running[0] == key:
+                if self._interrupt_running is not None:
+                    self._interrupt_running()
+                    return True
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(self._running[1]), ctypes.py_object(KeyboardInterrupt))
+                return True
+            if future is not None and not future.done():
+                # picked up by the worker, but _job hasn't started yet
+                self._interrupted.add(key)
+                return True
+        return False
+
+    def shutdown(self):
+        with self._lock:
+            running = self._running
+        if running is not None:
+            self.interrupt(running[0])
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,47 +1,64 @@
 from tkinter import *
 import tkinter.ttk as ttk
 import sys
-import ast
 import uuid
 import os
 import io
 import pyinotify # type: ignore
-import textwrap
-import importlib
 import traceback
+from dataflow import DependencyGraph, rerun as rerun_cells
+from cellcache import CellCache
+from cellcode import compile_cell, exec_block
+from reloader import ModuleGraph, Debouncer
+from inspector import short_repr, has_fields, page, field_count
+from notebook import NotebookStore
+from perftrack import PerfHistory, measure, flame, label, sparkline, format_run
 
 pretty_printer = {}
-cell_imports = {}
-imported_modules = {}
+cell_imports = {}  # module name -> cells that import it
+# all the cells share one namespace, the graph tracks what flows between them
+namespace = {}
+graph = DependencyGraph()
+# which module imports which, so a change reloads its importers too
+modules = ModuleGraph()
+modules.install()
+
+# lets automatic reruns skip cells whose code and inputs haven't changed
+cache = CellCache(module_deps=modules.imports)
+
+def reload_and_rerun(paths):
+    try:
+        reloaded = modules.reload(paths)
+    except Exception:
+        traceback.print_exc()
+        return
+    if reloaded:
+        print('==> reloaded', ', '.join(reloaded))
+    rerun({c for name in reloaded for c in cell_imports.get(name, ())})
+
+# saving a file fires a burst of events, so wait for them to settle and
+# handle all the changed files at once (back on the Tk thread)
+file_changes = Debouncer(0.1, lambda paths: root.after(0, reload_and_rerun, paths))
 
 class OnWriteHandler(pyinotify.ProcessEvent):
     def process_IN_MODIFY(self, event):
-        print('==> Modification detected', event.pathname)
-        print(cell_imports)
-        if event.pathname in cell_imports:
-            for c in cell_imports[event.pathname]:
-                print('rerunning', c.textbox.get('0.0', 'end'))
-                c.run(rerun_imports=True)
+        file_changes.add(event.pathname)
+
+    # editors that write a new file and rename it over the old one
+    process_IN_CLOSE_WRITE = process_IN_MOVED_TO = process_IN_MODIFY
 
 watch_manager = pyinotify.WatchManager()
 import_file_notifier = pyinotify.ThreadedNotifier(watch_manager, OnWriteHandler())
 import_file_notifier.start()
+watched_dirs = set()
 
-def _get_field(name, context):
-    '''Lookup a field in a context using its name, properly traversing
-       fields/values (i.e. `some_obj.field` or `some_obj['field']`). Returns
-       bool indicating whether the value is defined and the associated
-       value if it is.'''
-    subfields = name.split('.')
-    c = context
-    for i, f in enumerate(subfields):
-        if type(c) == dict and f in c:
-            c = c[f]
-        elif hasattr(c, f):
-            c = getattr(c, f)
-        else:
-            return False, None
-    return True, c
+def watch_modules():
+    '''watches the directories of every module loaded so far'''
+    for path in modules.files():
+        d = os.path.dirname(path)
+        if d not in watched_dirs:
+            watched_dirs.add(d)
+            watch_manager.add_watch(d, pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO)
 
 def selectable_text(frame, text, **kwargs):
     r = Text(frame, borderwidth=0, **kwargs)
@@ -56,6 +73,9 @@ def selectable_text(frame, text, **kwargs):
     r.bind('<Button-1>', focus_text)
     return r
 
+# children are added this many at a time
+TREEVIEW_PAGE_SIZE = 100
+
 def object_treeview(frame, obj, root_name='result'):
     tree = ttk.Treeview(frame)
 
@@ -66,31 +86,54 @@ def object_treeview(frame, obj, root_name='result'):
     tree.heading('#0', text='field')
     tree.heading('value', text='value')
 
-    root = tree.insert('', 1, text=root_name, values=(repr(obj),))
-
-    def f(node, obj, visited=set()):
-        if id(obj) in visited:
-            return
-        visited.add(id(obj))
-
-        d = {}
-        if isinstance(obj, dict):
-            d = obj
-        elif isinstance(obj, list):
-            d = dict(zip(range(len(obj)), obj))
-        elif hasattr(obj, '__dict__'):
-            d = obj.__dict__
-
-        for k, v in d.items():
-            print(k, v)
-            new_node = tree.insert(node, 'end', text=str(k), values=(repr(v),))
-            f(new_node, v)
-
-    f(root, obj)
+    # nodes are only filled in when they're opened: item -> (obj, ids of its
+    # ancestors' objects, so cycles can be cut off)
+    unopened = {}
+    # placeholder items that load the next page when selected:
+    # item -> (parent item, obj, start, ancestors)
+    more = {}
+
+    def add(parent, text, obj, ancestors):
+        item = tree.insert(parent, 'end', text=text, values=(short_repr(obj),))
+        if id(obj) in ancestors:
+            tree.item(item, values=('<cycle> ' + short_repr(obj),))
+        elif has_fields(obj):
+            unopened[item] = (obj, ancestors | {id(obj)})
+            tree.insert(item, 'end')  # so it gets an open arrow
+        return item
+
+    def add_page(item, obj, start, ancestors):
+        for k, v in page(obj, start, TREEVIEW_PAGE_SIZE):
+            add(item, str(k), v, ancestors)
+        remaining = field_count(obj) - start - TREEVIEW_PAGE_SIZE
+        if remaining > 0:
+            placeholder = tree.insert(item, 'end', text=f'... {remaining} more')
+            more[placeholder] = (item, obj, start + TREEVIEW_PAGE_SIZE, ancestors)
+
+    def on_open(event):
+        item = tree.focus()
+        if item in unopened:
+            obj, ancestors = unopened.pop(item)
+            tree.delete(*tree.get_children(item))
+            add_page(item, obj, 0, ancestors)
+
+    def on_select(event):
+        for placeholder in tree.selection():
+            if placeholder in more:
+                item, obj, start, ancestors = more.pop(placeholder)
+                tree.delete(placeholder)
+                add_page(item, obj, start, ancestors)
+
+    tree.bind('<<TreeviewOpen>>', on_open)
+    tree.bind('<<TreeviewSelect>>', on_select)
+    add('', root_name, obj, frozenset())
     return tree
 
+_NO_RESULT = object()
+_UNREADABLE = object()  # a stored output that failed to load
+
 class Cell:
-    def __init__(self, frame):
+    def __init__(self, frame, id=None):
         self.textbox = Text(frame, height=10)
         self.textbox.pack()
 
@@ -103,6 +146,12 @@ class Cell:
         self.output_frame.pack()
 
         self._hash = uuid.uuid1()
+        self.id = id or str(self._hash)
+
+        self.result = _NO_RESULT
+        # hash of the result in the notebook store, None if it's not stored
+        # (yet). Loaded cells have this but not the result until it's shown.
+        self.output_hash = None
 
     def __hash__(self):
         return hash(self._hash)
@@ -111,131 +160,164 @@ class Cell:
     def code(self):
         return self.textbox.get('0.0', 'end')
 
-    def run(self, rerun_imports=False):
-        program_text = self.textbox.get('0.0', 'end')
-        context_globals = {}
-        context_locals = {}
-
-        try:
-            tree = ast.parse(program_text, mode='exec')
-            v = FindImports()
-            v.visit(tree)
-
-            for module_name, module_alias in v.import_statements.items():
-                was_imported, module = _get_field(module_alias, imported_modules)
-
-                if was_imported:
-                    if hasattr(module, '__file__'):
-                        path = module.__file__
-                        if rerun_imports:
-                            print('reimporting ', module)
-                            importlib.reload(module)
-                        cell_imports[path].add(self)
-                    else:
-                        print(f'warning: skipping watch for {module_alias}. It has no file.')
-                else:
-                    print('importing ', module_name)
+    @property
+    def source(self):
+        '''the text exactly as typed'''
+        return self.textbox.get('1.0', 'end-1c')
 
-                    # FIXME won't work with e.g. `import module.submodule` because of the dot
-                    if '.' in module_name:
-                        raise Exception("can't import submodules at the moment -- import the module with an alias")
+    def stored_output(self, store):
+        '''the hash of the result in store, storing it if needed'''
+        if self.output_hash is None and self.result is not _NO_RESULT:
+            self.output_hash = store.put_output(self.result)
+        return self.output_hash
 
-                    imported_modules[module_alias] = importlib.import_module(module_name)
+    def load_output(self, store):
+        try:
+            self.result = store.output(self.output_hash)
+        except Exception:
+            # keeps the stored output (and doesn't try again on every scroll)
+            self.result = _UNREADABLE
+            selectable_text(self.output_frame, text=traceback.format_exc(), bg='red', height=10).pack()
+        else:
+            self.show_result(self.result)
 
-                    was_imported, module = _get_field(module_alias, imported_modules)
+    def run(self):
+        rerun([self])
 
-                    if hasattr(module, '__file__'):
-                        path = module.__file__
+    def execute(self, reuse=False):
+        '''runs just this cell. With reuse, an earlier run's result can stand
+           in if nothing it depends on changed.'''
+        program_text = self.textbox.get('0.0', 'end')
 
-                        cell_imports[path] = set([self])
-                        # TODO: recursively parse python module dependencies
-                        #       so if any files change, the entire thing gets reimported
-                        watch_manager.add_watch(os.path.dirname(path), pyinotify.IN_MODIFY)
-                    else:
-                        print(f'warning: skipping watch for {module_alias}. It has no file.')
+        try:
+            code = compile_cell(program_text)
+            for module_name in code.imports:
+                cell_imports.setdefault(module_name, set()).add(self)
 
             # clear out the previous results from the output frame
             for child in self.output_frame.winfo_children():
                 child.destroy()
 
-            result = exec_block(tree, context_globals,
-                                # only include the modules that were imported in this cell
-                                {**{name: mod for name, mod in imported_modules.items() if mod in v.import_statements.values()},
-                                 **context_locals})
+            self.result, self.output_hash = _NO_RESULT, None
+            runs = []
+            def run():
+                result, r = measure(lambda: exec_block(code, namespace, namespace),
+                                    memory=trace_memory.get(), profile=profile_runs.get())
+                runs.append(r)
+                return result
+            # a cached result wasn't a run, so there's nothing to record
+            result = cache.run(code, namespace, run, reuse=reuse)
+            for r in runs:
+                perf.record(self.id, code.digest, r)
         except Exception as e:
             # clear out the previous results from the output frame
             for child in self.output_frame.winfo_children():
                 child.destroy()
             selectable_text(self.output_frame, text=traceback.format_exc(), bg='red', height=10).pack()
         else:
-            if type(result) in pretty_printer:
-                print("Pretty printer available for ", type(result))
-                pretty_printer[type(result)](self, result)
-            else:
-                out_text = selectable_text(self.output_frame, repr(result), height=10)
-                out_text.pack()
-
-                object_treeview(self.output_frame, result).pack(fill=X)
-
-def exec_block(block, context_globals, context_locals):
-    # assumes last node is an expression
-    if isinstance(block.body[-1], ast.Expr):
-        last = ast.Expression(block.body.pop().value)
-
-        exec(compile(block, '<string>', mode='exec'), context_globals, context_locals)
-        return eval(compile(last, '<string>', mode='eval'), context_globals, context_locals)
-    else:
-        exec(compile(block, '<string>', mode='exec'), context_globals, context_locals)
-        return None
-
-def serialize_cells(stream, cells):
-    # TODO: store AST in Cell and serialize that instead. This will come
-    #       with challenges since the AST won't include comments, but it's
-    #       cleaner.
-
-    cells_node = ast.List(elts=[], ctx=ast.Load())
-    result_tree = ast.Module(body=[
-        # cells = [...]
-        ast.Assign(targets=[ast.Name(id='cells', ctx=ast.Store())], value=cells_node, lineno=1)
-        ], type_ignores=[])
-
-    for i, cell in enumerate(cells):
-        text = cell.textbox.get('0.0', 'end')
-        tree = ast.parse(text, mode='exec')
-        result_tree.body.append(ast.FunctionDef(name=f'cell_{i}',
-                        decorator_list=[],
-                        args=ast.arguments(args=[], posonlyargs=[], defaults=[], kwonlyargs=[]),
-                        lineno=i,
-                        body=tree.body or [ast.Pass()]))
-        cells_node.elts.append(ast.Name(id=f'cell_{i}', ctx=ast.Store()))
-
-    stream.write(
-        textwrap.dedent('''\
-        # DO NOT EDIT
-        # This file is autogenerated by pygoggles
-        '''))
-    stream.write(ast.unparse(result_tree))
+            self.result = result
+            self.show_result(result)
+            self.show_perf(code.digest)
+        # pick up whatever the cell imported, directly or not
+        watch_modules()
+
+    def show_result(self, result):
+        # subclasses (e.g. np.memmap) get their closest base's printer
+        printer = next((pretty_printer[t] for t in type(result).__mro__ if t in pretty_printer), None)
+        if printer is not None:
+            print("Pretty printer available for ", type(result))
+            printer(self, result)
+        else:
+            out_text = selectable_text(self.output_frame, short_repr(result, limit=10000), height=10)
+            out_text.pack()
 
-def save_file(filename):
-    print('saved', filename)
-    with open(filename, 'w') as f:
-        serialize_cells(f, cells)
+            object_treeview(self.output_frame, result).pack(fill=X)
 
-class FindImports(ast.NodeVisitor):
-    def __init__(self):
-        self.import_statements = {}
+    def show_perf(self, digest):
+        '''how long the runs of this version of the cell took, and the
+           profile of the last one if it was profiled'''
+        runs = perf.runs(self.id, digest)
+        if not runs:
+            return
+        text = f'{sparkline([r.wall for r in runs])}  {format_run(runs[-1])}'
+        Label(self.output_frame, text=text, font='TkFixedFont').pack(anchor=W)
+        latest = perf.latest(self.id, digest)
+        if latest.profile is not None:
+            flame_graph(self.output_frame, latest.profile).pack(fill=X)
+
+def flame_graph(frame, stats, width=650, row_height=16, char_width=7):
+    rects = flame(stats)
+    depth = max((d for d, _, _, _ in rects), default=0) + 1
+    canvas = Canvas(frame, width=width, height=depth * row_height, bg='white')
+    for d, start, w, func in rects:
+        x0, x1 = start * width, (start + w) * width
+        y = (depth - 1 - d) * row_height
+        # a warm color per function, the same wherever it shows up
+        color = '#%02x%02x%02x' % (255, 120 + hash(func[2]) % 100, 60 + hash(func[0]) % 60)
+        canvas.create_rectangle(x0, y, x1, y + row_height, fill=color, outline='white')
+        chars = int((x1 - x0 - 4) // char_width)
+        if chars >= 3:
+            text = label(func)
+            if len(text) > chars:
+                text = text[:chars - 2] + '..'
+            canvas.create_text(x0 + 2, y + row_height / 2, anchor=W, text=text, font=('TkFixedFont', 8))
+    return canvas
+
+def rerun(changed):
+    '''runs the changed cells and then the cells that read what they define,
+       in dependency order. Everything else is left alone.'''
+    def execute(c, reuse):
+        print('running', c.code)
+        c.execute(reuse=reuse)
+    rerun_cells(graph, changed, lambda c: c.code, namespace, execute, order=cells.index)
+
+# open notebooks, kept around so saving only writes what changed since
+stores = {}
+
+def open_store(filename):
+    if filename not in stores:
+        stores[filename] = NotebookStore(filename)
+    return stores[filename]
 
-    def visit_Import(self, node):
-        for x in node.names:
-            # use an import alias if there is one
-            self.import_statements[x.name] = x.asname if x.asname else x.name
+def save_file(filename):
+    store = open_store(filename)
+    written = store.save([(c.id, c.source, c.stored_output(store)) for c in cells])
+    print('saved', filename, f'({written} cells written)')
+
+def open_file(filename):
+    '''adds the cells stored in filename. Their outputs are only read once
+       they're scrolled into view.'''
+    store = open_store(filename)
+    for stored in store.cells():
+        c = Cell(frame, id=stored.id)
+        c.textbox.insert('1.0', stored.source)
+        c.output_hash = stored.output
+        cells.append(c)
+    update_scroll_region()
+    root.after_idle(load_visible_outputs, store)
+
+def load_visible_outputs(store):
+    top = canvas.canvasy(0)
+    bottom = top + canvas.winfo_height()
+    for c in cells:
+        if c.result is _NO_RESULT and c.output_hash is not None:
+            # outputs that aren't loaded yet take no space, so this is where
+            # the output will go
+            y = c.output_frame.winfo_y()
+            if top <= y <= bottom:
+                c.load_output(store)
+                update_scroll_region()
 
 root = Tk()
 canvas = Canvas(root, width=650, height=600)
 canvas.pack(side=LEFT, expand=YES, fill=BOTH)
 scrollbar = Scrollbar(root, command=canvas.yview)
 scrollbar.pack(side=LEFT, fill='y')
-canvas.configure(yscrollcommand=scrollbar.set)
+def on_canvas_scroll(first, last):
+    scrollbar.set(first, last)
+    if notebook_file in stores:
+        root.after_idle(load_visible_outputs, stores[notebook_file])
+canvas.configure(yscrollcommand=on_canvas_scroll)
 def update_scroll_region():
     canvas.configure(scrollregion=canvas.bbox('all'))
 canvas.bind('<Configure>', lambda _: update_scroll_region())
@@ -248,15 +330,30 @@ def add_cell():
     cells.append(Cell(frame))
     update_scroll_region()
 
-add_cell()
-add_cell()
+# `python goggles.py notebook.goggles` opens (or creates) that notebook
+notebook_file = sys.argv[1] if len(sys.argv) > 1 else 'cells.goggles'
+if os.path.exists(notebook_file):
+    open_file(notebook_file)
+if not cells:
+    add_cell()
+    add_cell()
 
 add_cell_button = Button(root, text='Add cell', command = add_cell)
 add_cell_button.pack()
 
-save_button = Button(root, text='Save', command = lambda: save_file('cells.py'))
+save_button = Button(root, text='Save', command = lambda: save_file(notebook_file))
 save_button.pack()
 
+# every run's timings are kept, by cell and version of its code
+perf = PerfHistory(notebook_file + '.perf')
+profile_runs = BooleanVar(root, value=False)
+profile_button = Checkbutton(root, text='Profile', variable=profile_runs)
+profile_button.pack()
+# off by default, tracing allocations slows them down and the times with it
+trace_memory = BooleanVar(root, value=False)
+trace_memory_button = Checkbutton(root, text='Trace memory', variable=trace_memory)
+trace_memory_button.pack()
+
 ## PRETTY PRINTER
 
 try:
@@ -264,21 +361,147 @@ try:
 except ModuleNotFoundError:
     pass
 else:
+    import arrayview
+
+    class ArrayGrid:
+        '''Shows the window of an array's elements that's on screen, reading
+           a new slice as it's scrolled. N-D arrays are shown a 2-D plane at a
+           time, picked with the axis and index spinboxes.'''
+        ROWS, COLS = 20, 8
+        CELL_WIDTH, CELL_HEIGHT = 80, 20
+        # above this many elements, stats wait for the button
+        EAGER_STATS = 10**7
+
+        def __init__(self, frame, arr):
+            self.arr = arr
+            self.row_axis, self.col_axis = 0, min(1, arr.ndim - 1)
+            self.index = []
+            self.top = self.left = 0
+
+            header = Frame(frame)
+            header.pack(fill=X)
+            Label(header, text=f'{arr.dtype} {arr.shape}').pack(side=LEFT)
+            self.stats_label = Label(header)
+            self.stats_label.pack(side=LEFT)
+            if arr.size <= self.EAGER_STATS:
+                self.show_stats()
+            else:
+                self.stats_button = Button(header, text='stats', command=self.show_stats)
+                self.stats_button.pack(side=LEFT)
+
+            if arr.ndim > 2:
+                self.axes_frame = Frame(frame)
+                self.axes_frame.pack(fill=X)
+                self.build_axis_controls()
+
+            grid = Frame(frame)
+            grid.pack(fill=X)
+            self.canvas = Canvas(grid, bg='white',
+                                 width=(self.COLS + 1) * self.CELL_WIDTH,
+                                 height=(self.ROWS + 1) * self.CELL_HEIGHT)
+            self.vscroll = Scrollbar(grid, command=lambda *args: self.scroll('y', *args))
+            self.hscroll = Scrollbar(grid, orient=HORIZONTAL, command=lambda *args: self.scroll('x', *args))
+            self.canvas.grid(row=0, column=0)
+            self.vscroll.grid(row=0, column=1, sticky='ns')
+            self.hscroll.grid(row=1, column=0, sticky='ew')
+            self.canvas.bind('<Button-4>', lambda e: self.scroll('y', 'scroll', -3, 'units'))
+            self.canvas.bind('<Button-5>', lambda e: self.scroll('y', 'scroll', 3, 'units'))
+            self.draw()
+
+        def show_stats(self):
+            s = arrayview.stats(self.arr)
+            if s is not None:
+                self.stats_label.config(
+                    text=f"min {s['min']}  max {s['max']}  mean {s['mean']:.6g}  NaNs {s['nans']}"
+                    if s['mean'] is not None else f"NaNs {s['nans']}")
+            if hasattr(self, 'stats_button'):
+                self.stats_button.destroy()
+
+        def build_axis_controls(self):
+            for child in self.axes_frame.winfo_children():
+                child.destroy()
+
+            def axis_spinbox(text, value, setter):
+                Label(self.axes_frame, text=text).pack(side=LEFT)
+                var = IntVar(value=value)
+                Spinbox(self.axes_frame, from_=0, to=self.arr.ndim - 1, width=3, textvariable=var,
+                        command=lambda: setter(var.get())).pack(side=LEFT)
+
+            axis_spinbox('rows: axis', self.row_axis, lambda v: self.set_axes(v, self.col_axis))
+            axis_spinbox('cols: axis', self.col_axis, lambda v: self.set_axes(self.row_axis, v))
+
+            others = [a for a in range(self.arr.ndim) if a not in (self.row_axis, self.col_axis)]
+            self.index = [min(i, self.arr.shape[a] - 1) for i, a in zip(self.index + [0] * len(others), others)]
+            for n, axis in enumerate(others):
+                Label(self.axes_frame, text=f'  axis {axis} at').pack(side=LEFT)
+                var = IntVar(value=self.index[n])
+                def set_index(n=n, var=var):
+                    self.index[n] = var.get()
+                    self.draw()
+                Spinbox(self.axes_frame, from_=0, to=self.arr.shape[axis] - 1, width=6,
+                        textvariable=var, command=set_index).pack(side=LEFT)
+
+        def set_axes(self, row_axis, col_axis):
+            if row_axis == col_axis:
+                # swap rather than show the same axis twice
+                if row_axis != self.row_axis:
+                    col_axis = self.row_axis
+                else:
+                    row_axis = self.col_axis
+            self.row_axis, self.col_axis = row_axis, col_axis
+            self.top = self.left = 0
+            self.build_axis_controls()
+            self.draw()
+
+        def scroll(self, axis, command, amount, unit=None):
+            p = arrayview.plane(self.arr, self.row_axis, self.col_axis, self.index)
+            total, visible = (p.shape[0], self.ROWS) if axis == 'y' else (p.shape[1], self.COLS)
+            first = self.top if axis == 'y' else self.left
+            if command == 'moveto':
+                first = int(float(amount) * total)
+            elif unit == 'pages':
+                first += int(amount) * visible
+            else:
+                first += int(amount)
+            first = max(0, min(first, total - visible))
+            if axis == 'y':
+                self.top = first
+            else:
+                self.left = first
+            self.draw()
+
+        def draw(self):
+            p = arrayview.plane(self.arr, self.row_axis, self.col_axis, self.index)
+            nrows, ncols = p.shape
+            rows = range(self.top, min(self.top + self.ROWS, nrows))
+            cols = range(self.left, min(self.left + self.COLS, ncols))
+            text = arrayview.format_window(p, rows, cols)
+
+            w, h = self.CELL_WIDTH, self.CELL_HEIGHT
+            self.canvas.delete('all')
+            for j, col in enumerate(cols):
+                self.canvas.create_text((j + 1.5) * w, h / 2, text=str(col), fill='gray')
+            for i, row in enumerate(rows):
+                self.canvas.create_text(w / 2, (i + 1.5) * h, text=str(row), fill='gray')
+                for j, value in enumerate(text[i]):
+                    self.canvas.create_text((j + 2) * w - 4, (i + 1.5) * h, text=value, anchor='e')
+
+            self.vscroll.set(self.top / max(nrows, 1), (self.top + len(rows)) / max(nrows, 1))
+            self.hscroll.set(self.left / max(ncols, 1), (self.left + len(cols)) / max(ncols, 1))
+
     def numpy_printer(cell: Cell, arr: numpy.array):
-        if len(arr.shape) == 2:
-            for row in range(arr.shape[0]):
-                for col in range(arr.shape[1]):
-                    Label(cell.output_frame, text=str(arr[row, col]), borderwidth=1).grid(row=row, column=col)
-        else:
-            # hacky fallback
-            Label(cell.output_frame, text=repr(arr)).pack()
+        ArrayGrid(cell.output_frame, arr)
 
     pretty_printer[numpy.ndarray] = numpy_printer
 
 sys.path.append(os.getcwd())
 
 root.mainloop()
+file_changes.cancel()
 import_file_notifier.stop()
+for store in stores.values():
+    store.close()
+perf.close()
 
 # TODO: support reloading loaded objects with from mod import *
 # TODO: capture stdout
@@ -290,8 +513,6 @@ import_file_notifier.stop()
 #       (maybe even attach to a process?) so that you can have cells
 #       run before/after/around another function (aspect oriented style)
 #       allowing you to debug code more easily
-# TODO: add persisting cells/results
-# TODO: add performance tracking (with graphs, and historized runs)
 # TODO: add ability to convert cell with output into an expect test (serialize output to pickle and save string?)
 # TODO: add editor integration so that you can hover on a function and
 #       see what's happening live
@@ -0,0 +1,49 @@
+'''Pieces for showing an arbitrary result object a bit at a time, so a huge
+or deeply nested result doesn't have to be walked (or repr'd) in full just
+to be displayed.'''
+import itertools
+import reprlib
+
+
+def short_repr(obj, limit=200):
+    '''repr(obj), abbreviated to about limit characters. Containers are only
+       looked at as far as they get printed.'''
+    abbreviated = reprlib.Repr()
+    abbreviated.maxlevel = 3
+    abbreviated.maxdict = abbreviated.maxlist = abbreviated.maxtuple = 20
+    abbreviated.maxset = abbreviated.maxfrozenset = 20
+    abbreviated.maxstring = abbreviated.maxother = limit
+    # (a __repr__ that raises comes back as '<Type instance at ...>')
+    r = abbreviated.repr(obj)
+    return r if len(r) <= limit else r[:limit - 3] + '...'
+
+
+def fields(obj):
+    '''an iterator over obj's (key, value) pairs: the items of a dict, the
+       elements of a list or tuple, or the attributes of an object'''
+    if isinstance(obj, dict):
+        return iter(obj.items())
+    if isinstance(obj, (list, tuple)):
+        return enumerate(obj)
+    d = getattr(obj, '__dict__', None)
+    if d is not None and hasattr(d, 'items'):
+        return iter(d.items())
+    return iter(())
+
+
+def has_fields(obj):
+    return next(fields(obj), None) is not None
+
+
+def page(obj, start, count):
+    '''the fields start to start + count'''
+    if isinstance(obj, (list, tuple)):
+        return list(enumerate(obj[start:start + count], start))
+    return list(itertools.islice(fields(obj), start, start + count))
+
+
+def field_count(obj):
+    if isinstance(obj, (dict, list, tuple)):
+        return len(obj)
+    d = getattr(obj, '__dict__', None)
+    return len(d) if d is not None and hasattr(d, 'items') else 0
@@ -0,0 +1,371 @@
+'''Runs cells in a separate process, so a crash, a runaway loop or a memory
+blow-up in user code takes down the kernel rather than the editor.
+
+The kernel owns the cells' namespace and talks to the front end over a
+socketpair.
+Requests and replies are small tuples; numpy arrays and rendered plots are
+written into shared memory and only their name, dtype and shape go through
+the pipe, so a big result isn't pickled and copied across. A cell's plots
+reuse the same block from run to run.
+
+Cells run under a sampling profiler (see sampler) and the front end is sent
+where the samples landed, by cell and line, after every run.'''
+import importlib
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import traceback
+import weakref
+from functools import wraps
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+from cellcode import compile_cell, exec_block
+from stream import RingBuffer
+from sampler import Sampler
+
+
+# == kernel side
+
+def _share(arr):
+    '''copies arr into a new shared memory block. The front end takes over
+       the block and unlinks it once it's done with the array.'''
+    import numpy as np  # type: ignore
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    # otherwise our resource tracker unlinks it when the kernel exits
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    shm.close()
+    return shm.name, arr.dtype.str, arr.shape
+
+
+def _rasterize(fig, dpi=None):
+    '''fig's pixels as an (h, w, 4) RGBA array. It's a view of the Agg
+       renderer's buffer, so it's only good until the next draw.'''
+    import numpy as np  # type: ignore
+    if dpi is not None:
+        fig.set_dpi(dpi)
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())
+
+
+class _Namespace:
+    '''the user's globals, with plt.plot wrapped so we know to send back a
+       figure, and stream() for live output'''
+
+    def __init__(self, notify=None):
+        self.globs = {}
+        self.images = {}  # cell key -> SharedMemory its plots are drawn into
+        self._notify = notify
+        self._key = None  # of the cell that's running
+        self.streams = {}  # cell key -> RingBuffers its last run made
+        self.globs['stream'] = self.stream
+        # the filename a cell's code was compiled under -> (its key, the
+        # version of the cell that was), for the current version of each cell
+        self.cell_files = {}
+        try:
+            import matplotlib  # type: ignore
+        except ImportError:
+            self.plt = None
+            return
+        # there's no display in here, figures are rasterized and sent back
+        matplotlib.use('Agg')
+        self.plt = self.globs['plt'] = importlib.import_module('matplotlib.pyplot')
+        self.globs['np'] = importlib.import_module('numpy')
+
+        _orig_plot = self.plt.plot
+        @wraps(_orig_plot)
+        def wrapped_plot(*args, **kwargs):
+            wrapped_plot.was_called = True
+            return _orig_plot(*args, **kwargs)
+        self.wrapped_plot = wrapped_plot
+
+    def _execute(self, code, dpi):
+        if self.plt is not None:
+            self.plt.clf()  # clear out plot
+            self.plt.plot = self.wrapped_plot
+            self.wrapped_plot.was_called = False
+        output = exec_block(code, self.globs)
+
+        if self.plt is not None and self.wrapped_plot.was_called:
+            return 'image', _rasterize(self.plt.gcf(), dpi)
+        return 'value', output
+
+    def _share_image(self, key, pixels):
+        '''copies pixels into key's block, growing it if it's too small. Unlike
+           _share's blocks these belong to the kernel, so the front end
+           mustn't unlink them.'''
+        import numpy as np  # type: ignore
+        shm = self.images.get(key)
+        if shm is None or shm.size < pixels.nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()  # the front end keeps its mapping
+            shm = self.images[key] = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+        np.ndarray(pixels.shape, pixels.dtype, buffer=shm.buf)[...] = pixels
+        return shm.name, pixels.dtype.str, pixels.shape
+
+    def stream(self, capacity=10000):
+        '''a RingBuffer the front end shows live while the cell runs. push()
+           samples into it.'''
+        ring = RingBuffer(capacity)
+        self.streams.setdefault(self._key, []).append(ring)
+        if self._notify is not None:
+            self._notify(('stream', ring.name, capacity))
+        return ring
+
+    def close(self):
+        for rings in self.streams.values():
+            for ring in rings:
+                ring.close(unlink=True)
+        for shm in self.images.values():
+            shm.close()
+            shm.unlink()
+
+    def _profile(self, sampler):
+        '''sends where sampler's samples landed'''
+        if self._notify is None or not sampler.samples:
+            return
+        cells, files = {}, {}
+        for filename, lines in sampler.by_file().items():
+            if filename in self.cell_files:
+                key, version = self.cell_files[filename]
+                cells[key] = version, lines
+            elif not filename.startswith('<'):
+                files[os.path.realpath(filename)] = lines
+        self._notify(('profile', sampler.samples, cells, files))
+
+    def run(self, source, key=None, dpi=None, profile_interval=None, version=None):
+        # the front end has its own mappings of the last run's streams
+        for ring in self.streams.pop(key, ()):
+            ring.close(unlink=True)
+        self._key = key
+        code = compile_cell(source, key)
+        # code from the cell's earlier versions doesn't line up with it now
+        self.cell_files = {f: kv for f, kv in self.cell_files.items() if kv[0] != key}
+        self.cell_files[code.filename] = key, version
+        if profile_interval is None:
+            kind, output = self._execute(code, dpi)
+        else:
+            sampler = Sampler(profile_interval)
+            try:
+                with sampler:
+                    kind, output = self._execute(code, dpi)
+            finally:
+                # an interrupted run is when you'd most like to know
+                self._profile(sampler)
+        if kind == 'image':
+            if key is None:
+                return 'image', _share(output)
+            return 'shared_image', self._share_image(key, output)
+        if type(output).__module__ == 'numpy' and type(output).__name__ == 'ndarray' \
+                and not output.dtype.hasobject:
+            return 'array', _share(output)
+        return 'text', str(output)
+
+
+def _main(conn):
+    def notify(message):
+        # a KeyboardInterrupt halfway through would garble the pipe
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+        try:
+            conn.send(message)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGINT})
+
+    ns = _Namespace(notify)
+    running = False
+
+    def on_sigint(signum, frame):
+        # only interrupt user code, not the loop talking to the front end
+        if running:
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGINT, on_sigint)
+    # Kernel.shutdown() terminates us, clean up the shared memory on the way
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    conn.send(('ready',))
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request[0] == 'run':
+                try:
+                    running = True
+                    try:
+                        reply = ns.run(*request[1:])
+                    finally:
+                        running = False
+                except SystemExit:
+                    raise
+                except BaseException:
+                    reply = 'error', traceback.format_exc()
+                conn.send(reply)
+    finally:
+        ns.close()
+
+
+# == front end side
+
+# blocks nothing refers to anymore. Closing a block while something still
+# views its memory raises BufferError, so they're closed once that's gone.
+# Both the thread calling execute() and the UI thread close them.
+_closing = []
+_closing_lock = threading.Lock()
+
+
+def close_unused():
+    '''unmaps the blocks that no array views anymore. Call it after dropping
+       arrays execute() returned (e.g. a plot being replaced); execute()
+       calls it too.'''
+    with _closing_lock:
+        for shm in list(_closing):
+            try:
+                shm.close()
+            except BufferError:
+                continue
+            _closing.remove(shm)
+
+
+def _retire(shm):
+    with _closing_lock:
+        _closing.append(shm)
+
+
+def _release(shm):
+    shm.unlink()
+    _retire(shm)
+
+
+def _attach(name, dtype, shape):
+    '''an array viewing the shared memory block the kernel sent back. The
+       block is unlinked once the array is garbage collected.'''
+    import numpy as np  # type: ignore
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype, buffer=shm.buf)
+    weakref.finalize(arr, _release, shm)
+    return arr
+
+
+class Kernel:
+    '''Front end handle on a kernel process.
+
+       execute() blocks until the kernel replies, so call it off the UI
+       thread (e.g. as a CellExecutor's run). It returns (kind, value):
+       'text' with the str() of the result, 'array' with a numpy array for an
+       ndarray result, 'image' with an (h, w, 4) RGBA uint8 array for a plot,
+       or 'error' with the formatted traceback.
+
+       Plots are drawn at dpi (matplotlib's default if it's None). When a key
+       is given -- e.g. the cell's -- each plot for that key is drawn into
+       the same memory, so the array from the last run changes under you.
+       It stays mapped for as long as the array (or a view of it) is alive,
+       so keep the array around while anything draws from its memory --
+       e.g. an image wrapping it without a copy -- and call close_unused()
+       once it's dropped.
+
+       on_stream(ring) is called (on the calling thread) with a RingBuffer
+       for each stream() the cell opens, while it's still running.
+
+       Cells run under a sampling profiler that looks every profile_interval
+       seconds (never, if it's None). After a run that was sampled,
+       on_profile(samples, cells, files) is called with where the samples
+       landed: cells maps the key of every cell whose code was on the stack
+       to (version, {line: samples}), version being what was passed to
+       execute() for the run of the cell the lines are from (so it can be
+       checked that they still match the cell); files maps module paths to
+       {line: samples}. Code from a cell that's since been run again with
+       different source isn't counted.
+
+       Every run executes the cell; nothing's cached in here.'''
+
+    def __init__(self, profile_interval=0.01):
+        self.profile_interval = profile_interval
+        self._images = {}  # key -> (name, SharedMemory) its plots come in
+        self._start()
+
+    def _start(self):
+        # a fresh interpreter rather than multiprocessing: forking a process
+        # with a GL context and threads isn't safe, and spawn would re-run
+        # the front end's script in the child
+        sock, child_sock = socket.socketpair()
+        self._process = subprocess.Popen(
+            [sys.executable, __file__, str(child_sock.fileno())],
+            pass_fds=(child_sock.fileno(),))
+        child_sock.close()
+        self._conn = Connection(sock.detach())
+        self._lock = threading.Lock()
+        # until the kernel says it's ready, SIGINT would kill it outright
+        self._ready = False
+
+    def execute(self, source, key=None, dpi=None, on_stream=None, on_profile=None, version=None):
+        close_unused()
+        if self._process.poll() is not None:
+            self._start()
+        # a restart swaps these out from under us, so hang on to the ones
+        # this request went to
+        conn, process, lock = self._conn, self._process, self._lock
+        with lock:
+            try:
+                if not self._ready and conn is self._conn:
+                    conn.recv()
+                    self._ready = True
+                conn.send(('run', source, key, dpi, self.profile_interval, version))
+                reply = conn.recv()
+                while reply[0] in ('stream', 'profile'):
+                    if reply[0] == 'stream' and on_stream is not None:
+                        on_stream(RingBuffer(reply[2], name=reply[1]))
+                    elif reply[0] == 'profile' and on_profile is not None:
+                        on_profile(*reply[1:])
+                    reply = conn.recv()
+                kind, value = reply
+            except (EOFError, OSError):
+                return 'error', f'kernel died (exit code {process.wait()})\n'
+        if kind in ('array', 'image'):
+            value = _attach(*value)
+        elif kind == 'shared_image':
+            kind, value = 'image', self._image(key, *value)
+        return kind, value
+
+    def _image(self, key, name, dtype, shape):
+        import numpy as np  # type: ignore
+        entry = self._images.get(key)
+        if entry is None or entry[0] != name:
+            if entry is not None:
+                # arrays from earlier runs may still be viewing it, it's
+                # closed once they're gone
+                _retire(entry[1])
+            shm = shared_memory.SharedMemory(name=name)
+            # the kernel owns it, don't let our resource tracker unlink it
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            entry = self._images[key] = (name, shm)
+        # frombuffer (unlike ndarray(buffer=...)) holds on to an export of
+        # the block's memoryview, so closing it raises BufferError -- rather
+        # than unmapping it -- for as long as this array or a view of it lives
+        count = math.prod(shape)
+        return np.frombuffer(entry[1].buf, dtype, count).reshape(shape)
+
+    def interrupt(self):
+        '''raises KeyboardInterrupt in the code the kernel is running'''
+        if self._ready and self._process.poll() is None:
+            self._process.send_signal(signal.SIGINT)
+
+    def restart(self):
+        '''throws away the namespace and starts a fresh kernel. A run in
+           progress comes back as an error.'''
+        self.shutdown()
+        self._start()
+
+    def shutdown(self):
+        self._process.terminate()
+        self._process.wait()
+
+
+if __name__ == '__main__':
+    _main(Connection(int(sys.argv[1])))
@@ -0,0 +1,128 @@
+'''Notebooks on disk, as an SQLite database.
+
+Cell sources are stored verbatim. Outputs are stored compressed in their own
+table keyed by a hash of their contents, so identical outputs are stored
+once and an unchanged output is never written again. numpy arrays (plots
+included) are stored as their raw buffer rather than pickled.
+
+Opening a notebook only reads the sources; an output is read when it's asked
+for. Saving compares against what's on disk and only writes the cells that
+changed. The order of the cells is kept in a row of its own, so inserting or
+moving a cell doesn't rewrite the cells after it.'''
+import hashlib
+import json
+import pickle
+import sqlite3
+import zlib
+from typing import NamedTuple, Optional
+
+_SCHEMA = '''
+create table if not exists cells (
+    id text primary key,
+    source text not null,
+    output text references outputs(hash)
+);
+create table if not exists cell_order (
+    ids text not null  -- JSON list of cell ids, one row
+);
+create table if not exists outputs (
+    hash text primary key,
+    kind text not null,
+    meta text not null,
+    data blob not null
+);
+'''
+
+
+class StoredCell(NamedTuple):
+    id: str
+    source: str
+    output: Optional[str]  # hash of its output, see NotebookStore.output
+
+
+def encode_output(value):
+    '''(kind, meta, data) for an output value'''
+    if type(value).__module__ == 'numpy' and type(value).__name__ == 'ndarray' \
+            and not value.dtype.hasobject:
+        return 'ndarray', json.dumps({'dtype': value.dtype.str, 'shape': value.shape}), value.tobytes()
+    if isinstance(value, str):
+        return 'text', '', value.encode()
+    try:
+        return 'pickle', '', pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # the best we can do for objects that can't be pickled
+        return 'text', '', repr(value).encode()
+
+
+def decode_output(kind, meta, data):
+    if kind == 'ndarray':
+        import numpy as np  # type: ignore
+        meta = json.loads(meta)
+        return np.frombuffer(data, dtype=meta['dtype']).reshape(meta['shape'])
+    if kind == 'text':
+        return data.decode()
+    return pickle.loads(data)
+
+
+class NotebookStore:
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        # what's on disk: id -> (source, output hash), and the ids in order
+        self._saved = {id: (source, output) for id, source, output
+                       in self._db.execute('select id, source, output from cells')}
+        row = self._db.execute('select ids from cell_order').fetchone()
+        self._order = json.loads(row[0]) if row is not None else []
+
+    def cells(self):
+        '''the stored cells in order, without their outputs'''
+        return [StoredCell(id, *self._saved[id]) for id in self._order if id in self._saved]
+
+    def output(self, hash):
+        '''the output stored under hash'''
+        row = self._db.execute('select kind, meta, data from outputs where hash = ?', (hash,)).fetchone()
+        if row is None:
+            raise KeyError(hash)
+        kind, meta, data = row
+        return decode_output(kind, meta, zlib.decompress(data))
+
+    def put_output(self, value):
+        '''stores an output (unless it's there already) and returns its hash'''
+        kind, meta, data = encode_output(value)
+        h = hashlib.sha256(f'{kind}\0{meta}\0'.encode() + data).hexdigest()
+        exists = self._db.execute('select 1 from outputs where hash = ?', (h,)).fetchone()
+        if exists is None:
+            self._db.execute('insert into outputs values (?, ?, ?, ?)',
+                             (h, kind, meta, zlib.compress(data, 1)))
+        return h
+
+    def save(self, cells):
+        '''cells is [(id, source, output hash)] in order. Returns how many
+           cells were written.'''
+        written = 0
+        with self._db:
+            new = {}
+            order = []
+            for id, source, output in cells:
+                new[id] = (source, output)
+                order.append(id)
+                if self._saved.get(id) != new[id]:
+                    self._db.execute('insert or replace into cells values (?, ?, ?)',
+                                     (id, source, output))
+                    written += 1
+            if order != self._order:
+                self._db.execute('delete from cell_order')
+                self._db.execute('insert into cell_order values (?)', (json.dumps(order),))
+            removed = self._saved.keys() - new.keys()
+            for id in removed:
+                self._db.execute('delete from cells where id = ?', (id,))
+            if removed or written:
+                self._db.execute('delete from outputs where hash not in '
+                                 '(select output from cells where output is not null)')
+        self._saved = new
+        self._order = order
+        return written
+
+    def close(self):
+        self._db.close()
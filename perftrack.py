@@ -0,0 +1,185 @@
+'''Performance tracking for cells. Each run's wall time and CPU time (and
+optionally its peak memory and a cProfile profile) are kept per cell and
+version of its code, so you can see an edit make a cell slower as you go.'''
+import cProfile
+import marshal
+import os
+import sqlite3
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+_SCHEMA = '''
+create table if not exists runs (
+    cell text not null,
+    code text not null,
+    started real not null,
+    wall real not null,
+    cpu real not null,
+    peak integer,
+    profile blob
+);
+create index if not exists runs_by_cell on runs (cell, started);
+'''
+
+
+class Run(NamedTuple):
+    started: float  # time.time() it started at
+    wall: float  # seconds
+    cpu: float  # seconds
+    peak: Optional[int]  # most bytes allocated at once, None if not traced
+    profile: Optional[dict] = None  # cProfile's stats, see flame()
+
+
+def measure(fn, memory=False, profile=False):
+    '''calls fn and returns (what it returned, its Run). With memory, the
+       peak is traced with tracemalloc -- and the times are taken with it
+       tracing, which can make allocation-heavy code several times slower.
+       Profiling slows down everything.'''
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        if memory:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if profile else None
+        started, wall, cpu = time.time(), time.perf_counter(), time.process_time()
+        result = fn() if profiler is None else profiler.runcall(fn)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        peak = tracemalloc.get_traced_memory()[1] - base if memory else None
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    stats = None
+    if profiler is not None:
+        profiler.create_stats()
+        stats = profiler.stats
+    return result, Run(started, wall, cpu, peak, stats)
+
+
+def label(func):
+    '''a readable name for one of a profile's functions'''
+    filename, line, name = func
+    if filename == '~':  # a builtin
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def flame(stats, min_fraction=0.005, max_depth=64):
+    '''the flame graph of a profile as [(depth, start, width, function)],
+       with start and width as fractions of the total time. Frames narrower
+       than min_fraction are left out.
+
+       cProfile only records which function called which, not whole stacks,
+       so a function's time under a caller is split between its callees in
+       proportion to the total time each spent called from it.'''
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller][func] = cumulative
+    roots = {func: stats[func][3] for func, value in stats.items() if not value[4]}
+    total = sum(roots.values())
+    rects = []
+    if total <= 0:
+        return rects
+
+    def visit(func, seconds, depth, start, path):
+        width = seconds / total
+        if width < min_fraction:
+            return
+        rects.append((depth, start, width, func))
+        if depth + 1 >= max_depth:
+            return
+        children = {f: t for f, t in callees[func].items() if f not in path}
+        spent = sum(children.values())
+        if spent <= 0:
+            return
+        # the share of func's time this frame is, and never more than fits
+        scale = min(seconds / stats[func][3] if stats[func][3] > 0 else 0, seconds / spent)
+        for child, t in sorted(children.items(), key=lambda item: label(item[0])):
+            visit(child, t * scale, depth + 1, start, path | {child})
+            start += t * scale / total
+
+    start = 0.0
+    for func, seconds in sorted(roots.items(), key=lambda item: label(item[0])):
+        visit(func, seconds, 0, start, frozenset([func]))
+        start += seconds / total
+    return rects
+
+
+_BARS = '▁▂▃▄▅▆▇█'
+
+
+def sparkline(values):
+    '''values as a string of bars, scaled between their min and max'''
+    if not values:
+        return ''
+    lo, hi = min(values), max(values)
+    if hi == lo:
+        return _BARS[0] * len(values)
+    return ''.join(_BARS[round((v - lo) / (hi - lo) * (len(_BARS) - 1))] for v in values)
+
+
+def _format_time(seconds):
+    if seconds < 1:
+        return f'{seconds * 1000:.3g} ms'
+    return f'{seconds:.3g} s'
+
+
+def _format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.3g} {unit}'
+        n /= 1024
+
+
+def format_run(run):
+    text = f'wall {_format_time(run.wall)}, cpu {_format_time(run.cpu)}'
+    if run.peak is not None:
+        text += f', peak {_format_bytes(run.peak)}'
+    return text
+
+
+class PerfHistory:
+    '''Runs in an SQLite database, by cell and code (e.g. the cell's id and
+       its code's digest).'''
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def record(self, cell, code, run):
+        profile = marshal.dumps(run.profile) if run.profile is not None else None
+        with self._db:
+            self._db.execute('insert into runs values (?, ?, ?, ?, ?, ?, ?)',
+                             (cell, code, run.started, run.wall, run.cpu, run.peak, profile))
+
+    def runs(self, cell, code=None, limit=50):
+        '''the last limit runs of cell (of just that version of its code if
+           code is given), oldest first and without their profiles'''
+        query = 'select started, wall, cpu, peak from runs where cell = ?'
+        args = [cell]
+        if code is not None:
+            query += ' and code = ?'
+            args.append(code)
+        rows = self._db.execute(query + ' order by started desc limit ?', args + [limit]).fetchall()
+        return [Run(*row) for row in reversed(rows)]
+
+    def latest(self, cell, code=None):
+        '''cell's last run, with its profile if it was profiled, or None'''
+        query = 'select started, wall, cpu, peak, profile from runs where cell = ?'
+        args = [cell]
+        if code is not None:
+            query += ' and code = ?'
+            args.append(code)
+        row = self._db.execute(query + ' order by started desc limit 1', args).fetchone()
+        if row is None:
+            return None
+        *fields, profile = row
+        return Run(*fields, marshal.loads(profile) if profile is not None else None)
+
+    def close(self):
+        self._db.close()
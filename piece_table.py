@@ -1,94 +1,757 @@
 # based on https://github.com/sparkeditor/piece-table/blob/master/index.js
+#
+# The pieces are kept in a treap (a randomized balanced binary tree) whose
+# nodes are ordered by document position and store the total length of their
+# subtree, so finding the piece at an offset and splicing new pieces in are
+# both O(log n) in the number of pieces. Every node also stores the number of
+# newlines in its subtree so line lookups are logarithmic too. Nodes and pieces
+# are never mutated after they're created -- edits build new nodes along the
+# path they touch -- so old versions of the tree share structure with the
+# current one, which is what the undo history relies on.
 from typing import *
-from dataclasses import dataclass, field
+from array import array
+import bisect
+import collections
+import contextlib
+import itertools
+import mmap
+import os
+import random
 
 class Piece:
-    __slots__ = ('type', 'offset', 'length')
-    def __init__(self, ty, offset, length):
-        self.type, self.offset, self.length = ty, offset, length
+    __slots__ = ('type', 'offset', 'length', 'newlines')
+    def __init__(self, ty, offset, length, newlines=0):
+        self.type, self.offset, self.length, self.newlines = ty, offset, length, newlines
 
     def __repr__(self):
-        return f'Piece<{self.type=} {self.offset=} {self.length=}>'
+        return f'Piece<{self.type=} {self.offset=} {self.length=} {self.newlines=}>'
+
+def _find_newlines(s, base, out):
+    i = s.find('\n')
+    while i != -1:
+        out.append(base + i)
+        i = s.find('\n', i + 1)
+
+class _Buffer:
+    '''text that pieces point into, along with the (sorted) offset of every
+       newline in it'''
+    def count_newlines(self, start, end):
+        return bisect.bisect_left(self.newlines, end) - bisect.bisect_left(self.newlines, start)
+
+    def close(self):
+        pass
+
+class _TextBuffer(_Buffer):
+    def __init__(self, text):
+        self.text = text
+        self.newlines = []
+        _find_newlines(text, 0, self.newlines)
+
+    def __len__(self):
+        return len(self.text)
+
+    def slice(self, start, end):
+        return self.text[start:end]
+
+class _AddBuffer(_Buffer):
+    '''append-only text stored as a list of fixed-size chunks, so appending
+       never copies more than one chunk'''
+    CHUNK_SIZE = 4096
+
+    def __init__(self):
+        self._chunks = ['']
+        self._length = 0
+        self.newlines = []
+
+    def __len__(self):
+        return self._length
+
+    def append(self, s):
+        _find_newlines(s, self._length, self.newlines)
+        self._length += len(s)
+        # walk s by offset, slicing off the rest each time would copy it
+        # once per chunk
+        pos = 0
+        while pos < len(s):
+            room = self.CHUNK_SIZE - len(self._chunks[-1])
+            self._chunks[-1] += s[pos:pos + room]
+            pos += room
+            if len(self._chunks[-1]) == self.CHUNK_SIZE:
+                self._chunks.append('')
+
+    def slice(self, start, end):
+        i, offset = divmod(start, self.CHUNK_SIZE)
+        parts = []
+        remaining = end - start
+        while remaining > 0:
+            part = self._chunks[i][offset:offset + remaining]
+            parts.append(part)
+            remaining -= len(part)
+            i, offset = i + 1, 0
+        return ''.join(parts)
+
+class _MappedBuffer(_Buffer):
+    '''a read-only memory map of a UTF-8 file. The text is decoded on demand;
+       all that's kept in memory is where each BLOCK_SIZE block starts (in
+       both bytes and characters) and the offsets of the newlines. Those
+       take 8 bytes a line and finding them reads the whole file once, but
+       they're what makes line counts and lookups cheap afterwards.
+
+       Bytes that aren't valid UTF-8 read as U+FFFD rather than failing.'''
+    BLOCK_SIZE = 1 << 16
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        self._byte_starts = array('q')
+        self._char_starts = array('q')
+        self.newlines = array('q')
+        byte = char = 0
+        while byte < size:
+            end = min(byte + self.BLOCK_SIZE, size)
+            # back up so the block doesn't end in the middle of a character
+            # (at most 3 bytes, past that it isn't one)
+            for _ in range(3):
+                if end >= size or self._map[end] & 0xC0 != 0x80:
+                    break
+                end -= 1
+            text = self._map[byte:end].decode('utf-8', 'replace')
+            self._byte_starts.append(byte)
+            self._char_starts.append(char)
+            _find_newlines(text, char, self.newlines)
+            byte, char = end, char + len(text)
+        # sentinel, so block i always spans [starts[i], starts[i+1])
+        self._byte_starts.append(byte)
+        self._char_starts.append(char)
+        self._length = char
+
+    def __len__(self):
+        return self._length
+
+    def slice(self, start, end):
+        if start >= end:
+            return ''
+
+        i = bisect.bisect_right(self._char_starts, start) - 1
+        j = bisect.bisect_right(self._char_starts, end - 1)
+        byte_start, byte_end = self._byte_starts[i], self._byte_starts[j]
+        char_start, char_end = self._char_starts[i], self._char_starts[j]
+        if byte_end - byte_start == char_end - char_start:
+            # these blocks are pure ASCII (or single bad bytes), so
+            # characters and bytes line up
+            return self._map[byte_start + start - char_start:byte_start + end - char_start].decode('ascii', 'replace')
+        # block by block, bad bytes decode differently once they're joined
+        text = ''.join(self._map[self._byte_starts[k]:self._byte_starts[k + 1]].decode('utf-8', 'replace')
+                       for k in range(i, j))
+        return text[start - char_start:end - char_start]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+class _Node:
+    __slots__ = ('piece', 'priority', 'left', 'right', 'length', 'newlines', 'pieces', 'added')
+    def __init__(self, piece, priority, left, right):
+        self.piece, self.priority, self.left, self.right = piece, priority, left, right
+        self.length = piece.length
+        self.newlines = piece.newlines
+        self.pieces = 1
+        self.added = piece.length if piece.type == 'add' else 0
+        if left is not None:
+            self.length += left.length
+            self.newlines += left.newlines
+            self.pieces += left.pieces
+            self.added += left.added
+        if right is not None:
+            self.length += right.length
+            self.newlines += right.newlines
+            self.pieces += right.pieces
+            self.added += right.added
+
+class _Edit:
+    '''an undo record: replacing the `length` characters at `offset` with
+       `tree` undoes (or redoes) an edit'''
+    __slots__ = ('offset', 'tree', 'length', 'coalesce')
+    def __init__(self, offset, tree, length, coalesce):
+        self.offset, self.tree, self.length, self.coalesce = offset, tree, length, coalesce
+
+def _merge_edits(edits):
+    '''merges runs of adjacent edits, e.g. typed characters or backspaces'''
+    merged = []
+    for op, offset, arg in edits:
+        if merged:
+            last = merged[-1]
+            if op == last[0] == 'insert' and offset == last[1] + last[3]:
+                last[2].append(arg)
+                last[3] += len(arg)
+                continue
+            if op == last[0] == 'delete' and offset + arg == last[1]:  # backspacing
+                last[1] = offset
+                last[2] += arg
+                continue
+            if op == last[0] == 'delete' and offset == last[1]:  # deleting forwards
+                last[2] += arg
+                continue
+        if op == 'insert':
+            merged.append([op, offset, [arg], len(arg)])
+        else:
+            merged.append([op, offset, arg])
+    return [(op, offset, ''.join(arg)) if op == 'insert' else (op, offset, arg)
+            for op, offset, arg, *_ in merged]
+
+def _merge(a, b):
+    '''concatenates two trees'''
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        return _Node(a.piece, a.priority, a.left, _merge(a.right, b))
+    return _Node(b.piece, b.priority, _merge(a, b.left), b.right)
+
+def _last_piece(node):
+    while node.right is not None:
+        node = node.right
+    return node.piece
+
+def _replace_last_piece(node, piece):
+    if node.right is None:
+        return _Node(piece, node.priority, node.left, None)
+    return _Node(node.piece, node.priority, node.left, _replace_last_piece(node.right, piece))
+
+def _build(pieces):
+    '''builds a balanced tree from a list of pieces in document order'''
+    # hand out priorities level by level so the tree is still a valid treap
+    priorities = sorted((random.random() for _ in pieces), reverse=True)
+    level_priority = [0.0] * len(pieces)
+    queue, k = collections.deque([(0, len(pieces))]), 0
+    while queue:
+        lo, hi = queue.popleft()
+        if lo < hi:
+            mid = (lo + hi) // 2
+            level_priority[mid] = priorities[k]
+            k += 1
+            queue.append((lo, mid))
+            queue.append((mid + 1, hi))
+
+    def build(lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        return _Node(pieces[mid], level_priority[mid], build(lo, mid), build(mid + 1, hi))
+    return build(0, len(pieces))
+
+def _append_merged(pieces, piece):
+    '''appends a piece, merging it into the last one if they're contiguous'''
+    last = pieces[-1] if pieces else None
+    if last is not None and last.type == piece.type and last.offset + last.length == piece.offset:
+        pieces[-1] = Piece(piece.type, last.offset, last.length + piece.length, last.newlines + piece.newlines)
+    else:
+        pieces.append(piece)
+
+def _iter_pieces(node):
+    '''in-order traversal of the pieces in a tree'''
+    stack = []
+    while stack or node is not None:
+        if node is not None:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            yield node.piece
+            node = node.right
 
 class PieceTable:
     def __init__(self, original):
-        self.original = original
-        self._add = ""
-        self._table = [Piece('original', 0, len(original))]
+        self._init(_TextBuffer(original))
 
-    def _piece_index(self, buffer_offset) -> int:
-        '''returns piece index and offset into the pieces buffer'''
-        if buffer_offset < 0:
-            raise ValueError('out of bounds')
+    @classmethod
+    def from_file(cls, path):
+        '''a piece table over a UTF-8 file that is memory mapped rather than
+           read into memory'''
+        table = cls.__new__(cls)
+        table._init(_MappedBuffer(path))
+        return table
 
-        remaining_offset = buffer_offset
-        for i, piece in enumerate(self._table):
-            if remaining_offset <= piece.length:
-                return i, piece.offset + remaining_offset
-            remaining_offset -= piece.length
+    def close(self):
+        '''lets go of the file a from_file table maps'''
+        self._buffers['original'].close()
 
-        raise ValueError('out of bounds')
+    def _init(self, original):
+        self._buffers = {'original': original, 'add': _AddBuffer()}
+        self._root = None
+        self._version = 0
+        self._str_cache = None
+        self._undo = []
+        self._redo = []
+        self._batch_depth = 0
+        self._listeners = []
+        self._changes = []
+        self._compaction_policy = None
+        if len(original):
+            piece = Piece('original', 0, len(original), len(original.newlines))
+            self._root = _Node(piece, random.random(), None, None)
 
-    def insert(self, s, offset):
-        if not s:
-            return
+    @property
+    def original(self):
+        return self._buffers['original'].slice(0, len(self._buffers['original']))
+
+    @property
+    def _add(self):
+        return self._buffers['add'].slice(0, len(self._buffers['add']))
+
+    @property
+    def _table(self):
+        '''the pieces in document order (for debugging)'''
+        return list(_iter_pieces(self._root))
+
+    def __len__(self):
+        return self._root.length if self._root is not None else 0
+
+    @property
+    def version(self):
+        '''bumped on every edit, so callers can tell whether anything they
+           derived from the text is stale'''
+        return self._version
+
+    def _set_root(self, root):
+        self._root = root
+        self._str_cache = None
+        if self._batch_depth:
+            self._batch_dirty = True
+        else:
+            self._edited()
+
+    def _edited(self):
+        self._version += 1
+        self._notify()
+        if self._compaction_policy is not None:
+            self._maybe_compact()
+
+    def add_listener(self, fn):
+        '''fn is called after every edit (or batch) with the list of
+           (offset, removed length, inserted length) changes it made. Each
+           offset is relative to the text left by the changes before it.'''
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        self._listeners.remove(fn)
+
+    def _notify(self):
+        changes, self._changes = self._changes, []
+        if changes:
+            for fn in list(self._listeners):
+                fn(changes)
+
+    def _split(self, node, offset):
+        '''splits the tree into one holding the first `offset` characters and one
+           holding the rest, cutting a piece in two if the offset falls inside it'''
+        if node is None:
+            return None, None
+
+        left_length = node.left.length if node.left is not None else 0
+        if offset < left_length:
+            l, r = self._split(node.left, offset)
+            return l, _Node(node.piece, node.priority, r, node.right)
+        if offset == left_length:
+            if node.left is None:
+                return None, node
+            return node.left, _Node(node.piece, node.priority, None, node.right)
+
+        offset -= left_length
+        piece = node.piece
+        if offset < piece.length:
+            head_newlines = self._buffers[piece.type].count_newlines(piece.offset, piece.offset + offset)
+            head = Piece(piece.type, piece.offset, offset, head_newlines)
+            tail = Piece(piece.type, piece.offset + offset, piece.length - offset, piece.newlines - head_newlines)
+            return (_Node(head, node.priority, node.left, None),
+                    _Node(tail, node.priority, None, node.right))
 
-        add_offset = len(self._add)
-        self._add += s
+        l, r = self._split(node.right, offset - piece.length)
+        return _Node(piece, node.priority, node.left, l), r
 
-        i, buf_offset = self._piece_index(offset)
-        piece = self._table[i]
+    def newline_count(self):
+        return self._root.newlines if self._root is not None else 0
 
-        if piece.type == 'add' and buf_offset == piece.offset + piece.length and piece.offset + piece.length == add_offset:
-            piece.length += len(s)
+    def newlines_before(self, offset):
+        '''number of newlines in the first `offset` characters'''
+        node = self._root
+        count = 0
+        while node is not None:
+            left_length, left_newlines = (node.left.length, node.left.newlines) if node.left is not None else (0, 0)
+            if offset < left_length:
+                node = node.left
+                continue
+
+            count += left_newlines
+            offset -= left_length
+            piece = node.piece
+            if offset <= piece.length:
+                return count + self._buffers[piece.type].count_newlines(piece.offset, piece.offset + offset)
+
+            count += piece.newlines
+            offset -= piece.length
+            node = node.right
+        return count
+
+    def newline_offset(self, n):
+        '''offset of the n-th newline (counting from 0)'''
+        if n < 0:
+            raise IndexError(n)
+
+        node = self._root
+        base = 0
+        while node is not None:
+            left_length, left_newlines = (node.left.length, node.left.newlines) if node.left is not None else (0, 0)
+            if n < left_newlines:
+                node = node.left
+                continue
+
+            n -= left_newlines
+            base += left_length
+            piece = node.piece
+            if n < piece.newlines:
+                newlines = self._buffers[piece.type].newlines
+                i = bisect.bisect_left(newlines, piece.offset) + n
+                return base + newlines[i] - piece.offset
+
+            n -= piece.newlines
+            base += piece.length
+            node = node.right
+        raise IndexError(n)
+
+    def insert(self, s, offset):
+        if offset < 0 or offset > len(self):
+            raise ValueError('out of bounds')
+
+        if not s:
             return
 
-        new_pieces = [x for x in (
-            Piece(piece.type, piece.offset, buf_offset - piece.offset),
-            Piece('add', add_offset, len(s)),
-            Piece(piece.type, buf_offset, piece.length - (buf_offset - piece.offset))
-            ) if x.length > 0]
+        l, r = self._split(self._root, offset)
+        self._record(offset, None, len(s), coalesce=len(s) == 1)
+        new_node = self._add_node(s)
 
-        self._table = self._table[:i] + new_pieces + self._table[i+1:]
+        # typing extends the piece that was added by the previous keystroke
+        if l is not None:
+            last, new = _last_piece(l), new_node.piece
+            if last.type == 'add' and last.offset + last.length == new.offset:
+                l = _replace_last_piece(l, Piece('add', last.offset, last.length + new.length, last.newlines + new.newlines))
+                self._set_root(_merge(l, r))
+                return
+
+        self._set_root(_merge(_merge(l, new_node), r))
 
     def delete(self, offset, length):
         if length == 0:
             return
 
-        if offset < 0:
+        if offset < 0 or length < 0 or offset + length > len(self):
             raise ValueError('out of bounds')
 
-        i, i_buf_offset = self._piece_index(offset)
-        j, j_buf_offset = self._piece_index(offset + length)
+        l, rest = self._split(self._root, offset)
+        removed, r = self._split(rest, length)
+        self._record(offset, removed, 0)
+        self._set_root(_merge(l, r))
 
-        if i == j:
-            piece = self._table[i]
-            if i_buf_offset == piece.offset:
-                piece.offset += length
-                piece.length -= length
-                return
+    def _add_node(self, s):
+        '''appends s to the add buffer and returns a single-piece tree for it'''
+        add = self._buffers['add']
+        add_offset, newlines = len(add), len(add.newlines)
+        add.append(s)
+        piece = Piece('add', add_offset, len(s), len(add.newlines) - newlines)
+        return _Node(piece, random.random(), None, None)
+
+    def replace(self, start, end, s):
+        self.replace_ranges([(start, end, s)])
+
+    def replace_ranges(self, ranges):
+        '''replaces each [start, end) with its text in a single pass over the
+           tree. Ranges are in terms of the current text and must not overlap;
+           empty ranges insert (e.g. typing at several cursors), and inserts at
+           the same offset keep the order they were given in.'''
+        ranges = sorted(ranges, key=lambda r: (r[0], r[1]))
+        prev_end = 0
+        for start, end, _ in ranges:
+            if start < prev_end or end < start or end > len(self):
+                raise ValueError('out of bounds or overlapping ranges')
+            prev_end = end
+
+        with self.batch():
+            result, rest = None, self._root
+            consumed = shift = 0
+            for start, end, s in ranges:
+                if start == end and not s:
+                    continue
+                left, rest = self._split(rest, start - consumed)
+                removed, rest = self._split(rest, end - start)
+                consumed = end
+                result = _merge(result, left)
+                if s:
+                    result = _merge(result, self._add_node(s))
+                self._record(start + shift, removed, len(s))
+                shift += len(s) - (end - start)
+            self._set_root(_merge(result, rest))
 
-            if j_buf_offset == piece.offset + piece.length:
-                piece.length -= length
+    # batches and undo history
+    #
+    # Each undo record holds the subtree an edit removed and how much it
+    # inserted, so undoing swaps the two back. The subtrees are shared with the
+    # document (nodes are immutable), so a record costs O(1) memory no matter
+    # how much text it covers, and undo/redo cost O(log n). The undo stack
+    # holds groups of records so a batch of edits is undone in one go.
+
+    @contextlib.contextmanager
+    def batch(self):
+        '''treats the edits made inside the block as one: they share a single
+           undo record and bump the version once at the end'''
+        if self._batch_depth == 0:
+            self._batch_edits, self._batch_dirty = [], False
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                if self._batch_edits:
+                    self._push_undo(self._batch_edits)
+                if self._batch_dirty:
+                    self._edited()
+
+    def apply_edits(self, edits):
+        '''applies a sequence of ('insert', offset, text) and ('delete', offset,
+           length) edits as a batch. Each offset is relative to the text left by
+           the edits before it, and runs of adjacent edits (typing, backspacing)
+           are merged before anything is applied.'''
+        with self.batch():
+            for op, offset, arg in _merge_edits(edits):
+                if op == 'insert':
+                    self.insert(arg, offset)
+                elif op == 'delete':
+                    self.delete(offset, arg)
+                else:
+                    raise ValueError(f'unknown edit {op!r}')
+
+    def _record(self, offset, removed, inserted, coalesce=False):
+        self._redo.clear()
+        self._changes.append((offset, removed.length if removed is not None else 0, inserted))
+        edit = _Edit(offset, removed, inserted, coalesce)
+        if self._batch_depth:
+            self._batch_edits.append(edit)
+        else:
+            self._push_undo([edit])
+
+    def _push_undo(self, group):
+        if len(group) == 1 and self._undo and len(self._undo[-1]) == 1:
+            last, edit = self._undo[-1][0], group[0]
+            # merge runs of typed characters into a single record
+            if (edit.coalesce and last.coalesce and last.tree is None
+                    and last.offset + last.length == edit.offset):
+                last.length += edit.length
                 return
+        self._undo.append(group)
 
-        delete_pieces = [x for x in (
-            Piece(self._table[i].type, self._table[i].offset, i_buf_offset - self._table[i].offset),
-            Piece(self._table[j].type, j_buf_offset, self._table[j].length - (j_buf_offset - self._table[j].offset))
-            ) if x.length > 0]
+    def _swap(self, edit):
+        l, rest = self._split(self._root, edit.offset)
+        current, r = self._split(rest, edit.length)
+        restored = edit.tree.length if edit.tree is not None else 0
+        self._changes.append((edit.offset, edit.length, restored))
+        self._set_root(_merge(_merge(l, edit.tree), r))
+        # the record now describes how to get back to where we were
+        edit.tree, edit.length, edit.coalesce = current, restored, False
+        return edit.offset + restored
 
-        self._table = self._table[:i] + delete_pieces + self._table[j+1:]
+    def undo(self):
+        '''reverts the last edit (or batch) and returns the offset just past
+           the text it restored, or None if there's nothing to undo'''
+        if not self._undo:
+            return None
+        group = self._undo.pop()
+        self._redo.append(group)
+        with self.batch():
+            for edit in reversed(group):
+                pos = self._swap(edit)
+        return pos
 
-        # if the table is empty, put a 0-length piece in there so we have at least one piece.
-        if not self._table:
-            self._table = [Piece('original', 0, 0)]
+    def redo(self):
+        '''reapplies the last undone edit (or batch) and returns the offset
+           just past the text it restored, or None if there's nothing to redo'''
+        if not self._redo:
+            return None
+        group = self._redo.pop()
+        self._undo.append(group)
+        with self.batch():
+            for edit in group:
+                pos = self._swap(edit)
+        return pos
 
-    def as_str(self):
-        s = ""
-        for piece in self._table:
-            if piece.type == 'add':
-                s += self._add[piece.offset:piece.offset+piece.length]
-            elif piece.type == 'original':
-                s += self.original[piece.offset:piece.offset+piece.length]
-        return s
+    # compaction
+    #
+    # Long editing sessions leave lots of small pieces behind and the add
+    # buffer keeps text that was deleted long ago. Compacting rewrites the add
+    # buffer to hold the document's added text in document order (so all the
+    # pieces of a run of added text merge into one), followed by whatever text
+    # only the undo history still refers to.
 
+    def _history_edits(self):
+        for group in itertools.chain(self._undo, self._redo):
+            for edit in group:
+                yield edit
+
+    def _referenced_add_ranges(self, trees):
+        '''sorted, disjoint ranges of the add buffer that the trees refer to'''
+        ranges = sorted((p.offset, p.offset + p.length)
+                        for tree in trees
+                        for p in _iter_pieces(tree) if p.type == 'add')
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def stats(self):
+        '''fragmentation stats. Lengths are in characters; dead_add is add
+           buffer text that neither the document nor the undo history uses.'''
+        pieces = self._root.pieces if self._root is not None else 0
+        add_length = len(self._buffers['add'])
+        trees = itertools.chain([self._root], (edit.tree for edit in self._history_edits()))
+        referenced = sum(end - start for start, end in self._referenced_add_ranges(trees))
+        return {
+            'pieces': pieces,
+            'length': len(self),
+            'average_piece_length': len(self) / pieces if pieces else 0,
+            'original_length': len(self._buffers['original']),
+            'add_length': add_length,
+            'live_add': self._root.added if self._root is not None else 0,
+            'dead_add': add_length - referenced,
+        }
+
+    def compact(self):
+        '''rewrites the add buffer without dead text and merges adjacent pieces.
+           The text, version and undo history are unchanged.'''
+        if self._batch_depth:
+            raise RuntimeError("can't compact in the middle of a batch")
+
+        old, add = self._buffers['add'], _AddBuffer()
+        segments = []  # (old start, old end, new start)
+        doc = []
+        for p in _iter_pieces(self._root):
+            if p.type == 'add':
+                segments.append((p.offset, p.offset + p.length, len(add)))
+                p = Piece('add', len(add), p.length, p.newlines)
+                add.append(old.slice(segments[-1][0], segments[-1][1]))
+            _append_merged(doc, p)
+
+        # text only the undo history refers to goes after the document's
+        disjoint = []
+        for segment in sorted(segments):
+            if not disjoint or segment[0] >= disjoint[-1][1]:
+                disjoint.append(segment)
+        starts = [segment[0] for segment in disjoint]
+        history = list(self._history_edits())
+        for start, end in self._referenced_add_ranges(edit.tree for edit in history):
+            i = bisect.bisect_right(starts, start) - 1
+            pos = start
+            for seg_start, seg_end, _ in disjoint[max(i, 0):]:
+                if seg_start >= end:
+                    break
+                if seg_start > pos:
+                    segments.append((pos, seg_start, len(add)))
+                    add.append(old.slice(pos, seg_start))
+                pos = max(pos, seg_end)
+            if pos < end:
+                segments.append((pos, end, len(add)))
+                add.append(old.slice(pos, end))
+
+        disjoint = []
+        for segment in sorted(segments):
+            if not disjoint or segment[0] >= disjoint[-1][1]:
+                disjoint.append(segment)
+        starts = [segment[0] for segment in disjoint]
+
+        def rebuild(tree):
+            pieces = []
+            for p in _iter_pieces(tree):
+                if p.type != 'add':
+                    _append_merged(pieces, p)
+                    continue
+                # the piece may now be spread over several segments
+                pos, end = p.offset, p.offset + p.length
+                i = bisect.bisect_right(starts, pos) - 1
+                while pos < end:
+                    seg_start, seg_end, new_start = disjoint[i]
+                    n = min(end, seg_end) - pos
+                    offset = new_start + pos - seg_start
+                    _append_merged(pieces, Piece('add', offset, n, add.count_newlines(offset, offset + n)))
+                    pos += n
+                    i += 1
+            return _build(pieces)
+
+        self._buffers['add'] = add
+        self._root = _build(doc)
+        for edit in history:
+            edit.tree = rebuild(edit.tree)
+
+        self._compacted_at = (self._root.pieces if self._root is not None else 0, len(add))
+
+    def set_compaction_policy(self, max_pieces=None, max_dead_ratio=None):
+        '''compact automatically after an edit once the document has more than
+           max_pieces pieces, or once more than max_dead_ratio of the add buffer
+           is text the document no longer uses. To keep the cost amortized, a
+           trigger only fires again after the piece count or add buffer has
+           doubled since the last compaction. Pass nothing to turn it off.'''
+        if max_pieces is None and max_dead_ratio is None:
+            self._compaction_policy = None
+        else:
+            self._compaction_policy = (max_pieces, max_dead_ratio)
+            self._compacted_at = (0, 0)
+
+    def _maybe_compact(self):
+        max_pieces, max_dead_ratio = self._compaction_policy
+        pieces = self._root.pieces if self._root is not None else 0
+        add_length = len(self._buffers['add'])
+        # a cheap estimate -- text that only the undo history uses counts as dead
+        dead_add = add_length - (self._root.added if self._root is not None else 0)
+        last_pieces, last_add_length = self._compacted_at
+
+        if max_pieces is not None and pieces > max_pieces and pieces >= 2 * last_pieces:
+            self.compact()
+        elif (max_dead_ratio is not None and add_length >= 2 * last_add_length
+              and dead_add > max_dead_ratio * add_length):
+            self.compact()
+
+    def _chunks(self, node, base, start, end):
+        if node is None or end <= base or base + node.length <= start:
+            return
+
+        left_length = node.left.length if node.left is not None else 0
+        yield from self._chunks(node.left, base, start, end)
+
+        piece = node.piece
+        piece_start = base + left_length
+        lo, hi = max(start, piece_start), min(end, piece_start + piece.length)
+        if lo < hi:
+            offset = piece.offset + lo - piece_start
+            yield self._buffers[piece.type].slice(offset, offset + hi - lo)
+
+        yield from self._chunks(node.right, piece_start + piece.length, start, end)
+
+    def iter_chunks(self, start=0, end=None):
+        '''lazily yields the text in [start, end) one piece at a time'''
+        if end is None:
+            end = len(self)
+        if start < 0 or end > len(self) or start > end:
+            raise ValueError('out of bounds')
+        return self._chunks(self._root, 0, start, end)
+
+    def substr(self, start, end):
+        return ''.join(self.iter_chunks(start, end))
+
+    def as_str(self):
+        # rebuilt lazily, so reading the text repeatedly between edits is free
+        if self._str_cache is None:
+            self._str_cache = ''.join(self.iter_chunks())
+        return self._str_cache
@@ -0,0 +1,173 @@
+'''Reloads changed modules along with the modules that import them.
+
+An __import__ hook records which module imports which, so when a file
+changes the module behind it and everything that (transitively) imports it
+can be reloaded in dependency order -- otherwise an importer would keep
+using the names it bound from the old version (e.g. `from b import f`).
+
+Only modules that aren't part of the standard library or installed
+packages are tracked, those are the ones being edited.'''
+import builtins
+import importlib
+import importlib.util
+import os
+import sys
+import sysconfig
+import threading
+from collections import defaultdict
+
+
+_library_dirs = tuple({os.path.realpath(sysconfig.get_path(p)) + os.sep
+                       for p in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+
+
+def _module_file(module):
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    if path.startswith(_library_dirs):
+        return None
+    return path
+
+
+class ModuleGraph:
+    def __init__(self):
+        self._imports = defaultdict(set)  # importer -> names it imported
+        self._orig_import = None
+
+    def install(self):
+        '''starts recording imports'''
+        if self._orig_import is None:
+            self._orig_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._orig_import is not None:
+            builtins.__import__ = self._orig_import
+            self._orig_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = self._orig_import(name, globals, locals, fromlist, level)
+        importer = globals.get('__name__') if globals else None
+        if importer is None:
+            return module
+        try:
+            if level > 0:
+                package = globals.get('__package__') or importer.rpartition('.')[0]
+                name = importlib.util.resolve_name('.' * level + name, package)
+        except (ImportError, ValueError):
+            return module
+        # `import a.b` binds a but runs (and depends on) both
+        parts = name.split('.')
+        for i in range(1, len(parts) + 1):
+            self.add(importer, '.'.join(parts[:i]))
+        for item in fromlist or ():
+            if f'{name}.{item}' in sys.modules:  # from package import submodule
+                self.add(importer, f'{name}.{item}')
+        return module
+
+    def add(self, importer, imported):
+        if importer != imported:
+            self._imports[importer].add(imported)
+
+    def files(self):
+        '''{path: module name} for the tracked modules that are loaded'''
+        return {path: name for name, module in list(sys.modules.items())
+                if (path := _module_file(module)) is not None}
+
+    def dependents(self, names):
+        '''names and every module that (transitively) imports one of them'''
+        importers = defaultdict(set)
+        for importer, imported in self._imports.items():
+            for name in imported:
+                importers[name].add(importer)
+        seen = set(names)
+        stack = list(names)
+        while stack:
+            for importer in importers[stack.pop()]:
+                if importer not in seen:
+                    seen.add(importer)
+                    stack.append(importer)
+        return seen
+
+    def imports(self, names):
+        '''names and every module they (transitively) import'''
+        seen = set(names)
+        stack = list(names)
+        while stack:
+            for imported in self._imports.get(stack.pop(), ()):
+                if imported not in seen:
+                    seen.add(imported)
+                    stack.append(imported)
+        return seen
+
+    def reload_order(self, names):
+        '''the loaded, tracked modules among names and their dependents, each
+           after the modules it imports. Modules importing each other in a
+           cycle come out in an arbitrary but stable order.'''
+        affected = {name for name in self.dependents(names)
+                    if _module_file(sys.modules.get(name)) is not None}
+        order = []
+        done = set()
+
+        def visit(name, visiting):
+            if name in done or name in visiting:
+                return
+            visiting.add(name)
+            for imported in sorted(self._imports.get(name, ())):
+                if imported in affected:
+                    visit(imported, visiting)
+            done.add(name)
+            order.append(name)
+
+        for name in sorted(affected):
+            visit(name, set())
+        return order
+
+    def reload(self, paths):
+        '''reloads the modules behind paths and their dependents, returning
+           the names of the modules reloaded. Stops at the first module that
+           fails to reload, raising its exception.'''
+        files = self.files()
+        changed = {files[p] for p in map(os.path.realpath, paths) if p in files}
+        order = self.reload_order(changed)
+        for name in order:
+            importlib.reload(sys.modules[name])
+        return order
+
+
+class Debouncer:
+    '''Collects keys passed to add() and hands them to callback as one set
+       once nothing new has arrived for delay seconds. callback runs on a
+       timer thread.'''
+
+    def __init__(self, delay, callback):
+        self.delay = delay
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+
+    def add(self, key):
+        with self._lock:
+            self._pending.add(key)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._timer = None
+        if pending:
+            self._callback(pending)
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._pending = set()
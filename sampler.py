@@ -0,0 +1,73 @@
+'''A sampling profiler cheap enough to leave on. A background thread looks at
+what the profiled thread is running every so often and counts, per file and
+line, how many of those looks found it there; nothing is hooked into the
+profiled code itself, so it runs at full speed in between.
+
+A line is counted if it's anywhere on the stack, so the line in a cell that
+calls a slow function is as hot as the function.'''
+import sys
+import threading
+from collections import Counter, defaultdict
+
+
+class Sampler:
+    '''Samples the thread that calls start() (or thread_id) every interval
+       seconds until stop(). Can be started and stopped repeatedly, the
+       counts add up until clear().'''
+
+    def __init__(self, interval=0.01, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = 0
+        self.counts = Counter()  # (filename, line) -> samples
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        target = self.thread_id if self.thread_id is not None else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(target,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self, target):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                continue
+            seen = set()  # recursion only counts once
+            while frame is not None:
+                seen.add((frame.f_code.co_filename, frame.f_lineno))
+                frame = frame.f_back
+            self.counts.update(seen)
+            self.samples += 1
+
+    def lines(self, filename):
+        '''{line: samples} for filename'''
+        return {line: n for (f, line), n in list(self.counts.items()) if f == filename}
+
+    def by_file(self):
+        '''{filename: {line: samples}}'''
+        files = defaultdict(dict)
+        for (f, line), n in list(self.counts.items()):
+            files[f][line] = n
+        return dict(files)
+
+    def clear(self):
+        self.samples = 0
+        self.counts = Counter()
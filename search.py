@@ -0,0 +1,186 @@
+'''Search over a Buffer without joining it into one string.
+
+Literal searches find every occurrence of the pattern, including ones that
+overlap, and can span lines. Regex searches run over one line at a time (like
+grep), so a match never includes a newline.
+
+SearchIndex keeps the matches for a pattern up to date as the buffer is
+edited, rescanning only the text around each edit.
+'''
+import bisect
+import math
+import re
+
+
+def _find_literal(chunks, base, pattern):
+    '''yields (start, end) of every occurrence of pattern in the text made up
+       of chunks, which starts at offset base'''
+    keep = len(pattern) - 1
+    window = ''
+    for chunk in chunks:
+        window += chunk
+        i = window.find(pattern)
+        while i != -1:
+            yield base + i, base + i + len(pattern)
+            i = window.find(pattern, i + 1)
+        # hold on to the tail that could be the start of a match spanning
+        # into the next chunk. It's too short to hold a whole match, so
+        # nothing is reported twice.
+        cut = max(0, len(window) - keep)
+        base += cut
+        window = window[cut:]
+
+
+def _line_matches(regex, text, base):
+    for m in regex.finditer(text):
+        if m.end() > m.start():  # empty matches aren't worth highlighting
+            yield base + m.start(), base + m.end()
+
+
+def _find_regex(chunks, base, regex):
+    line = []
+    for chunk in chunks:
+        *complete, rest = chunk.split('\n')
+        for l in complete:
+            line.append(l)
+            text = ''.join(line)
+            yield from _line_matches(regex, text, base)
+            base += len(text) + 1
+            line = []
+        line.append(rest)
+    yield from _line_matches(regex, ''.join(line), base)
+
+
+def _compile(pattern, regex, flags):
+    if not pattern:
+        raise ValueError('empty search pattern')
+    return re.compile(pattern, flags) if regex else None
+
+
+def finditer(buf, pattern, regex=False, flags=0, start=0, end=None):
+    '''lazily yields (start, end) for each match in buf[start:end], streaming
+       over the buffer's pieces'''
+    compiled = _compile(pattern, regex, flags)
+    chunks = buf.iter_chunks(start, end)
+    if regex:
+        return _find_regex(chunks, start, compiled)
+    return _find_literal(chunks, start, pattern)
+
+
+def _shift(x, offset, removed, delta):
+    '''where position x ends up after a change'''
+    if x >= offset + removed:
+        return x + delta
+    return min(x, offset)
+
+
+class SearchIndex:
+    '''The matches of a pattern in a buffer, kept up to date through edits.
+
+       Matches are stored on either side of a gap, like a gap buffer: the ones
+       before it by absolute offset and the ones after it by distance from the
+       end of the text. Edits only move matches across the gap near where
+       they happen, so matches far away from an edit are never touched. Edits
+       are queued and the text around them is rescanned on the next query.'''
+
+    def __init__(self, buf, pattern, regex=False, flags=0):
+        self._buf = buf
+        self._pattern = pattern
+        self._regex = _compile(pattern, regex, flags)
+        # a literal match starting this far before an edit can overlap it
+        self._margin = 0 if regex else len(pattern) - 1
+        self._len = len(buf)
+        self._head = []  # (start, end), ascending
+        self._tail = []  # (len - start, len - end), ascending, so the last one is nearest the gap
+        # closed ranges of match starts that need rescanning
+        self._dirty = [(0, self._len)]
+        buf.add_listener(self._on_change)
+
+    def close(self):
+        self._buf.remove_listener(self._on_change)
+
+    def _move_gap(self, pos):
+        '''moves the gap so every match before it starts before pos'''
+        head, tail, n = self._head, self._tail, self._len
+        while head and head[-1][0] >= pos:
+            s, e = head.pop()
+            tail.append((n - s, n - e))
+        while tail and n - tail[-1][0] < pos:
+            ds, de = tail.pop()
+            head.append((n - ds, n - de))
+
+    def _drop_through(self, pos):
+        '''drops the matches just after the gap that start before pos'''
+        while self._tail and self._len - self._tail[-1][0] < pos:
+            self._tail.pop()
+
+    def _on_change(self, changes):
+        for offset, removed, inserted in changes:
+            lo = max(0, offset - self._margin)
+            self._move_gap(lo)
+            self._drop_through(offset + removed)
+            delta = inserted - removed
+            self._dirty = [(_shift(a, offset, removed, delta), _shift(b, offset, removed, delta))
+                           for a, b in self._dirty]
+            self._dirty.append((lo, offset + inserted))
+            # matches after the gap are stored relative to the end, so they
+            # don't need shifting
+            self._len += delta
+
+    def _flush(self):
+        if not self._dirty:
+            return
+
+        buf, n = self._buf, self._len
+        ranges = []
+        for a, b in sorted(self._dirty):
+            a, b = max(0, a), min(n, b)
+            if self._regex is not None:
+                # regexes match within a line, so rescan whole lines
+                a = buf.pos_for_line(buf.line(a))
+                last = buf.line(b)
+                b = buf.pos_for_line(last) + buf.line_length(last) - 1
+            if ranges and a <= ranges[-1][1] + 1:
+                ranges[-1][1] = max(ranges[-1][1], b)
+            else:
+                ranges.append([a, b])
+        self._dirty = []
+
+        for a, b in ranges:
+            self._move_gap(a)
+            self._drop_through(b + 1)
+            if self._regex is not None:
+                found = _find_regex(buf.iter_chunks(a, b), a, self._regex)
+            else:
+                chunks = buf.iter_chunks(a, min(n, b + len(self._pattern)))
+                found = (m for m in _find_literal(chunks, a, self._pattern) if m[0] <= b)
+            self._head.extend(found)
+
+    def matches(self, start=0, end=None):
+        '''lazily yields (start, end) for the matches starting in [start, end),
+           e.g. the visible part of the buffer. The buffer shouldn't be edited
+           while iterating.'''
+        self._flush()
+        n = self._len
+        if end is None:
+            end = n
+
+        head = self._head
+        for i in range(bisect.bisect_left(head, (start,)), len(head)):
+            if head[i][0] >= end:
+                return
+            yield head[i]
+
+        tail = self._tail
+        for i in range(bisect.bisect_right(tail, (n - start, math.inf)) - 1, -1, -1):
+            ds, de = tail[i]
+            if n - ds >= end:
+                return
+            yield n - ds, n - de
+
+    def __iter__(self):
+        return self.matches()
+
+    def __len__(self):
+        self._flush()
+        return len(self._head) + len(self._tail)
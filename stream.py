@@ -0,0 +1,70 @@
+'''Live output: a running cell pushes samples into a ring buffer in shared
+memory and the front end draws whatever has arrived, frame by frame, without
+waiting for the cell to finish.
+
+The buffer is one writer, any number of readers and no locks: the writer
+stores a sample and then bumps the count, and a reader that gets lapped just
+sees a few newer samples than it expected.'''
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+_COUNT = struct.Struct('q')
+
+
+class RingBuffer:
+    '''The last capacity floats pushed. Created by the kernel, attached to by
+       name on the front end.'''
+
+    def __init__(self, capacity=10000, name=None):
+        self.capacity = capacity
+        size = _COUNT.size + 8 * capacity
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # the creator unlinks it, don't let our resource tracker too
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._count = self._shm.buf[:_COUNT.size].cast('q')
+        self._data = self._shm.buf[_COUNT.size:size].cast('d')
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def count(self):
+        '''how many samples have been pushed in total'''
+        return self._count[0]
+
+    def push(self, value):
+        n = self._count[0]
+        self._data[n % self.capacity] = value
+        self._count[0] = n + 1
+
+    def extend(self, values):
+        for v in values:
+            self.push(v)
+
+    def values(self, start=0, end=None):
+        '''samples start to end (counting from the first ever pushed), or as
+           many of the last of them as are still in the buffer'''
+        if end is None:
+            end = self.count
+        start = max(start, end - self.capacity)
+        if start >= end:
+            return []
+        i, j = start % self.capacity, end % self.capacity
+        if i < j:
+            return self._data[i:j].tolist()
+        return self._data[i:].tolist() + self._data[:j].tolist()
+
+    def __getstate__(self):
+        # it only means anything while its kernel is alive
+        raise TypeError("a RingBuffer can't be pickled")
+
+    def close(self, unlink=False):
+        self._count.release()
+        self._data.release()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
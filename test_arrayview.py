@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+else:
+    import arrayview
+
+@unittest.skipIf(np is None, 'needs numpy')
+class TestArrayView(unittest.TestCase):
+    def test_plane(self):
+        arr = np.arange(2 * 3 * 4).reshape(2, 3, 4)
+        np.testing.assert_array_equal(arr[1], arrayview.plane(arr, 1, 2, (1,)))
+        np.testing.assert_array_equal(arr[:, 2, :].T, arrayview.plane(arr, 2, 0, (2,)))
+        self.assertEqual((5, 1), arrayview.plane(np.arange(5), 0, 0).shape)
+        self.assertEqual((1, 1), arrayview.plane(np.array(3.0), 0, 0).shape)
+
+    def test_format_window(self):
+        arr = np.arange(100).reshape(10, 10)
+        self.assertEqual([['23', '24'], ['33', '34']], arrayview.format_window(arr, range(2, 4), range(3, 5)))
+        self.assertEqual([['0.5']], arrayview.format_window(np.array([[0.5]]), range(1), range(1)))
+
+    def test_stats(self):
+        arr = np.array([[1.0, np.nan], [3.0, 8.0]])
+        s = arrayview.stats(arr)
+        self.assertEqual((1.0, 8.0, 4.0, 1), (s['min'], s['max'], s['mean'], s['nans']))
+        self.assertIsNone(arrayview.stats(np.array([], dtype=float)))
+        self.assertIsNone(arrayview.stats(np.array(['a'])))
+        self.assertEqual(2, arrayview.stats(np.full(2, np.nan))['nans'])
+
+        big = np.arange(10**6, dtype=np.int64)
+        with mock.patch.object(arrayview, 'STATS_BLOCK', 1000):
+            s = arrayview.stats(big)
+        self.assertEqual((0, 10**6 - 1, (10**6 - 1) / 2), (s['min'], s['max'], s['mean']))
+
+    def test_stats_blocks(self):
+        arr = np.arange(4 * 50 * 30, dtype=float).reshape(4, 50, 30)
+        arr[1, 2, 3] = np.nan
+        # a strided view, in blocks smaller than a row and than the whole
+        view = arr[:, ::2, ::3]
+        for block_size in (7, 100, 10**6):
+            with mock.patch.object(arrayview, 'STATS_BLOCK', block_size):
+                blocks = list(arrayview._blocks(view))
+                s = arrayview.stats(view)
+            self.assertEqual(view.size, sum(b.size for b in blocks))
+            self.assertTrue(all(b.size <= max(block_size, 10) for b in blocks))
+            # views of the array, nothing copied
+            self.assertTrue(all(np.shares_memory(b, arr) for b in blocks))
+            finite = view[~np.isnan(view)]
+            self.assertEqual((finite.min(), finite.max(), 1), (s['min'], s['max'], s['nans']))
+            self.assertAlmostEqual(finite.mean(), s['mean'])
+        self.assertEqual(5.0, arrayview.stats(np.array(5.0))['mean'])
+
+    def test_summary(self):
+        text = arrayview.summary(np.arange(30).reshape(3, 10), rows=2, cols=3)
+        self.assertEqual('int64 array of shape (3, 10)\n'
+                         'min 0  max 29  mean 14.5  nans 0\n'
+                         ' 0   1   2  ...\n'
+                         '10  11  12  ...\n'
+                         '...', text)
+        self.assertEqual('float64 array of shape (0, 2)', arrayview.summary(np.zeros((0, 2))))
+        self.assertEqual('float64 array of shape (2, 2, 1)\nnans 4\nnan  nan\nnan  nan',
+                         arrayview.summary(np.full((2, 2, 1), np.nan)))
+
+if __name__ == '__main__':
+    unittest.main()
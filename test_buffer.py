@@ -1,5 +1,7 @@
 from buffer import Buffer
 import unittest
+from hypothesis import given
+import hypothesis.strategies as st
 
 class TestBuffer(unittest.TestCase):
     def test_line_and_col_with_one_char_line(self):
@@ -25,3 +27,49 @@ class TestBuffer(unittest.TestCase):
         for i in range(len(lines)):
             self.assertEqual(int(lines[i]), b.line(i))
             self.assertEqual(int(col[i]), b.col(i))
+
+    def test_line_text_and_iter_lines(self):
+        b = Buffer('abc\n\ndefgh\nij')
+        b.insert('xy\nz', 2)
+        lines = 'abxy\nzc\n\ndefgh\nij'.split('\n')
+        self.assertEqual(lines, [b.line_text(n) for n in range(b.nlines())])
+        self.assertEqual(lines, list(b.iter_lines()))
+        self.assertEqual(lines[1:3], list(b.iter_lines(1, 3)))
+        self.assertEqual(lines[3:], list(b.iter_lines(3, 100)))
+        self.assertEqual([], list(b.iter_lines(2, 2)))
+
+    def test_replace_all(self):
+        b = Buffer('foo bar\nfoo\nbaz foo')
+        self.assertEqual(3, b.replace_all('foo', 'qu\nux'))
+        self.assertEqual('qu\nux bar\nqu\nux\nbaz qu\nux', b.as_str())
+        self.assertEqual(6, b.nlines())
+        b.undo()
+        self.assertEqual('foo bar\nfoo\nbaz foo', b.as_str())
+
+    @given(st.data())
+    def test_line_index_follows_edits(self, data):
+        t = data.draw(st.text(alphabet='ab\n'), label='initial buffer')
+        b = Buffer(t)
+        for _ in range(data.draw(st.integers(min_value=0, max_value=30))):
+            if data.draw(st.booleans()):
+                i = data.draw(st.integers(min_value=0, max_value=len(t)))
+                sub = data.draw(st.text(alphabet='ab\n'))
+                t = t[:i] + sub + t[i:]
+                b.insert(sub, i)
+            else:
+                start = data.draw(st.integers(min_value=0, max_value=len(t)))
+                length = data.draw(st.integers(min_value=0, max_value=len(t) - start))
+                t = t[:start] + t[start+length:]
+                b.delete(start, length)
+
+            lines = t.split('\n')
+            self.assertEqual(len(lines), b.nlines())
+            self.assertEqual(lines, list(b.iter_lines()))
+            pos = 0
+            for n, l in enumerate(lines):
+                self.assertEqual(pos, b.pos_for_line(n))
+                self.assertEqual(len(l) + 1, b.line_length(n))
+                for c in range(len(l) + 1):
+                    self.assertEqual(n, b.line(pos + c))
+                    self.assertEqual(c, b.col(pos + c))
+                pos += len(l) + 1
@@ -0,0 +1,172 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from cellcache import CellCache
+from cellcode import compile_cell, exec_block
+from reloader import ModuleGraph
+
+class TestCellCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CellCache()
+        self.ns = {}
+        self.runs = []
+
+    def run_cell(self, source, cache=None, reuse=False):
+        code = compile_cell(source)
+        def execute():
+            self.runs.append(source)
+            exec_block(code, self.ns)
+            return self.ns.get('out')
+        return (cache if cache is not None else self.cache).run(code, self.ns, execute, reuse=reuse)
+
+    def test_hit(self):
+        self.run_cell('a = 2')
+        self.assertEqual(6, self.run_cell('out = a * 3'))
+        del self.ns['out']
+        # comments and formatting don't matter
+        self.assertEqual(6, self.run_cell('out = a*3  # again', reuse=True))
+        self.assertEqual(6, self.ns['out'])
+        self.assertEqual(['a = 2', 'out = a * 3'], self.runs)
+
+    def test_same_values_keep_readers(self):
+        self.run_cell('x = 1')
+        self.run_cell('y = x + 1')
+        # x ran again but came out the same, so y needn't
+        self.run_cell('x = 1')
+        self.run_cell('y = x + 1', reuse=True)
+        self.assertEqual(['x = 1', 'y = x + 1', 'x = 1'], self.runs)
+        self.run_cell('x = 2')
+        self.run_cell('y = x + 1', reuse=True)
+        self.assertEqual(3, self.ns['y'])
+        self.assertEqual(5, len(self.runs))
+
+    def test_explicit_runs_execute(self):
+        self.run_cell('lst = []')
+        self.assertEqual(1, self.run_cell('lst.append(1); out = len(lst)'))
+        self.assertEqual(2, self.run_cell('lst.append(1); out = len(lst)'))
+        # a fresh value of an input means its readers can't be reused
+        self.run_cell('import random; r = random.random()')
+        self.run_cell('out = r', reuse=True)
+        first = self.ns['r']
+        self.run_cell('import random; r = random.random()')
+        self.assertNotEqual(first, self.run_cell('out = r', reuse=True))
+        self.assertEqual(7, len(self.runs))
+
+    def test_unfingerprinted_values(self):
+        # too big to hash, so a fresh run always invalidates its readers
+        self.run_cell('big = list(range(10**6))')
+        self.run_cell('out = len(big)')
+        self.run_cell('big = list(range(10**6))')
+        self.run_cell('out = len(big)', reuse=True)
+        self.assertEqual(4, len(self.runs))
+
+    def test_aliasing(self):
+        self.run_cell('a = [1]')
+        self.run_cell('b = a')
+        self.run_cell('b = a', reuse=True)
+        self.assertEqual(2, len(self.runs))
+        self.assertIs(self.ns['a'], self.ns['b'])
+
+    def test_too_big_not_copied(self):
+        class Big:
+            nbytes = 10 ** 9
+            def __reduce__(self):
+                raise AssertionError('pickled')
+        with tempfile.TemporaryDirectory() as d:
+            cache = CellCache(path=d)
+            self.ns['Big'] = Big
+            self.run_cell('out = Big()', cache)
+            self.assertEqual((0, 0, []), (len(cache), cache.size, os.listdir(d)))
+
+    def test_inputs_change(self):
+        self.run_cell('a = 2')
+        self.run_cell('out = a * 3')
+        self.run_cell('a = 5')
+        self.assertEqual(15, self.run_cell('out = a * 3', reuse=True))
+        # back to an earlier version of a, so both cells hit
+        self.run_cell('a = 2', reuse=True)
+        self.assertEqual(6, self.run_cell('out = a * 3', reuse=True))
+        self.assertEqual(4, len(self.runs))
+        self.assertEqual(6, self.ns['out'])
+
+    def test_reads_itself(self):
+        self.run_cell('x = 1')
+        self.run_cell('x += 1', reuse=True)
+        self.run_cell('x += 1', reuse=True)
+        self.assertEqual(3, self.ns['x'])
+        # x is defined before it's read, so this one's cacheable
+        self.run_cell('y = 1; out = y + 1')
+        self.run_cell('y = 1; out = y + 1', reuse=True)
+        self.assertEqual(4, len(self.runs))
+
+    def test_unpicklable(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = CellCache(path=d)
+            self.run_cell('def f(): return 1', cache)
+            self.run_cell('def f(): return 1', cache, reuse=True)
+            self.assertEqual(1, len(self.runs))
+            # kept in memory, but can't be written out
+            self.assertEqual([], os.listdir(d))
+
+    def test_modules(self):
+        with tempfile.TemporaryDirectory() as d:
+            sys.path.insert(0, d)
+            self.addCleanup(sys.path.remove, d)
+            self.addCleanup(sys.modules.pop, 'cachemod', None)
+            path = os.path.join(d, 'cachemod.py')
+            with open(path, 'w') as f:
+                f.write('v = 1\n')
+            self.run_cell('import cachemod; out = cachemod.v')
+            self.run_cell('import cachemod; out = cachemod.v', reuse=True)
+            self.assertEqual(1, len(self.runs))
+            self.assertEqual(1, self.ns['cachemod'].v)
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            self.run_cell('import cachemod; out = cachemod.v', reuse=True)
+            self.assertEqual(2, len(self.runs))
+
+    def test_indirect_modules(self):
+        graph = ModuleGraph()
+        cache = CellCache(module_deps=graph.imports)
+        with tempfile.TemporaryDirectory() as d:
+            sys.path.insert(0, d)
+            self.addCleanup(sys.path.remove, d)
+            for name in ('ind_a', 'ind_b'):
+                self.addCleanup(sys.modules.pop, name, None)
+            with open(os.path.join(d, 'ind_a.py'), 'w') as f:
+                f.write('import ind_b\ndef f(): return ind_b.v\n')
+            b = os.path.join(d, 'ind_b.py')
+            with open(b, 'w') as f:
+                f.write('v = 1\n')
+            graph.install()
+            try:
+                self.assertEqual(1, self.run_cell('import ind_a; out = ind_a.f()', cache))
+            finally:
+                graph.uninstall()
+            with open(b, 'w') as f:
+                f.write('v = 22\n')
+            os.utime(b, ns=(time.time_ns(), time.time_ns() + 10**9))
+            self.assertEqual(['ind_b', 'ind_a'], graph.reload([b]))
+            self.assertEqual(22, self.run_cell('import ind_a; out = ind_a.f()', cache, reuse=True))
+            self.assertEqual(2, len(self.runs))
+
+    def test_eviction(self):
+        cache = CellCache(max_bytes=3000)
+        for i in range(10):
+            self.run_cell(f'out = "{i}" * 1000', cache)
+        self.assertLessEqual(cache.size, 3000)
+        self.assertGreater(cache.size, 2000)
+        self.assertEqual(2, len(cache))
+        self.run_cell('out = "9" * 1000', cache, reuse=True)
+        self.run_cell('out = "0" * 1000', cache, reuse=True)
+        self.assertEqual(11, len(self.runs))
+
+    def test_persist(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.run_cell('out = [1, 2]', CellCache(path=d))
+            self.assertEqual([1, 2], self.run_cell('out = [1, 2]', CellCache(path=d), reuse=True))
+            self.assertEqual(1, len(self.runs))
+
+if __name__ == '__main__':
+    unittest.main()
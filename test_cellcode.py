@@ -0,0 +1,40 @@
+import ast
+import unittest
+from cellcode import compile_cell, exec_block
+
+class TestCellCode(unittest.TestCase):
+    def test_exec_block(self):
+        ns = {}
+        self.assertEqual(3, exec_block(compile_cell('a = 1\na + 2'), ns))
+        self.assertIsNone(exec_block(compile_cell('b = a'), ns))
+        self.assertIsNone(exec_block(compile_cell(''), ns))
+        self.assertEqual(1, ns['b'])
+
+    def test_reused(self):
+        source = 'x = [1]\nx * 2'
+        code = compile_cell(source)
+        self.assertIs(code, compile_cell(source))
+        dump = ast.dump(code.tree)
+        # running it over and over doesn't eat the trailing expression
+        for _ in range(3):
+            self.assertEqual([1, 1], exec_block(code, {}))
+        self.assertEqual(dump, ast.dump(code.tree))
+
+    def test_analysis(self):
+        code = compile_cell('import os.path, json as j\nfrom sys import argv\ny = x + 1  # hi')
+        self.assertEqual(('json', 'os.path', 'sys'), code.imports)
+        self.assertEqual({'os', 'j', 'argv', 'y'}, code.defines)
+        self.assertEqual({'x'}, code.inputs)
+        self.assertEqual(code.digest, compile_cell('import os.path, json as j\nfrom sys import argv\ny = x+1').digest)
+
+    def test_filename(self):
+        code = compile_cell('x = 1\n1 / 0')
+        self.assertEqual(code.filename, code.body.co_filename)
+        self.assertEqual(code.filename, code.last.co_filename)
+        # the same AST laid out differently has different line numbers
+        self.assertNotEqual(code.filename, compile_cell('x = 1\n\n1 / 0').filename)
+        self.assertNotEqual(code.filename, compile_cell('x = 1\n1 / 0', cell=2).filename)
+        self.assertEqual(code.digest, compile_cell('x = 1\n1 / 0', cell=2).digest)
+
+if __name__ == '__main__':
+    unittest.main()
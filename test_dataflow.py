@@ -0,0 +1,74 @@
+import unittest
+from cellcache import CellCache
+from cellcode import compile_cell, exec_block
+from dataflow import cell_names, DependencyGraph, rerun
+
+class TestCellNames(unittest.TestCase):
+    def test_names(self):
+        defines, reads = cell_names(
+            'import os.path as p\n'
+            'def f(a):\n'
+            '    return a + y + [z for z in w]\n'
+            'x = x + 1\n'
+            'print(f(k))\n')
+        self.assertEqual({'p', 'f', 'x'}, defines)
+        self.assertEqual({'y', 'w', 'k', 'print'}, reads)
+
+    def test_syntax_error(self):
+        with self.assertRaises(SyntaxError):
+            cell_names('x =')
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.g = DependencyGraph()
+        self.g.set_cell('c', 'c = a + b')
+        self.g.set_cell('a', 'a = 1')
+        self.g.set_cell('b', 'b = a * 2')
+        self.g.set_cell('d', 'd = 4')
+
+    def test_schedule(self):
+        self.assertEqual(['a', 'b', 'c'], self.g.schedule(['a']))
+        self.assertEqual(['b', 'c'], self.g.schedule(['b']))
+        self.assertEqual(['d'], self.g.schedule(['d']))
+        self.assertEqual(['a', 'b', 'c', 'd'], self.g.schedule(['d', 'a']))
+
+    def test_set_cell(self):
+        self.assertEqual(frozenset(), self.g.set_cell('a', 'a = 1'))
+        self.assertEqual({'a'}, self.g.set_cell('a', 'e = 1'))
+        # b still reads a even though nobody defines it anymore
+        self.assertEqual(['b', 'c'], self.g.schedule([], names={'a'}))
+        self.assertEqual(['a'], self.g.schedule(['a']))
+
+    def test_cycle(self):
+        self.g.set_cell('a', 'a = c')
+        self.assertEqual(['c', 'a', 'b'], self.g.schedule(['b'], order='cab'.index))
+
+class TestRerun(unittest.TestCase):
+    def test_rerun_with_cache(self):
+        sources = {'a': 'x = 1', 'b': 'y = x + 1', 'c': 'z = y * 2', 'd': 'w = 0'}
+        graph, cache, namespace, runs = DependencyGraph(), CellCache(), {}, []
+        def execute(cell, reuse):
+            code = compile_cell(sources[cell])
+            def run():
+                runs.append(cell)
+                exec_block(code, namespace)
+            cache.run(code, namespace, run, reuse=reuse)
+        def run_cells(changed):
+            runs.clear()
+            rerun(graph, changed, sources.get, namespace, execute, order='abcd'.index)
+            return list(runs)
+
+        self.assertEqual(['a', 'b', 'c', 'd'], run_cells('abcd'))
+        # a runs again but comes out the same, so b and c come from the cache
+        self.assertEqual(['a'], run_cells(['a']))
+        self.assertEqual(4, namespace['z'])
+        sources['a'] = 'x = 5'
+        self.assertEqual(['a', 'b', 'c'], run_cells(['a']))
+        self.assertEqual(12, namespace['z'])
+        # b stops defining y, so it's gone rather than stale
+        sources['b'], sources['c'] = 'pass', 'z = 0'
+        run_cells(['b', 'c'])
+        self.assertNotIn('y', namespace)
+
+if __name__ == '__main__':
+    unittest.main()
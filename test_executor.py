@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest
+from executor import CellExecutor
+
+class TestCellExecutor(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.finished = threading.Event()
+
+        def on_event(key, event, value):
+            self.events.append((key, event, type(value) if event == 'error' else value))
+            if key == 'last' and event != 'started':
+                self.finished.set()
+
+        def run(x):
+            if x == 'spin':
+                while True:
+                    time.sleep(0.001)
+            return x * 2
+
+        self.executor = CellExecutor(run, on_event)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_runs_in_order_and_replaces_queued(self):
+        self.executor.submit('a', 'spin')
+        while self.executor.status('a') != 'running':
+            time.sleep(0.001)
+        self.executor.submit('b', 1)
+        self.executor.submit('b', 2)
+        self.assertEqual('queued', self.executor.status('b'))
+
+        self.assertTrue(self.executor.interrupt('a'))
+        self.executor.submit('last', 3)
+        self.assertTrue(self.finished.wait(5))
+        self.assertEqual([('a', 'started', None), ('a', 'error', KeyboardInterrupt),
+                          ('b', 'started', None), ('b', 'done', 4),
+                          ('last', 'started', None), ('last', 'done', 6)], self.events)
+        self.assertIsNone(self.executor.status('b'))
+
+    def test_interrupt_queued(self):
+        self.executor.submit('a', 'spin')
+        self.executor.submit('b', 1)
+        self.assertTrue(self.executor.interrupt('b'))
+        self.assertIsNone(self.executor.status('b'))
+        self.assertFalse(self.executor.interrupt('b'))
+        self.executor.interrupt('a')
+        self.executor.submit('last', 1)
+        self.assertTrue(self.finished.wait(5))
+        self.assertNotIn(('b', 'started', None), self.events)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import time
+import unittest
+from inspector import short_repr, fields, has_fields, page, field_count
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+class TestInspector(unittest.TestCase):
+    def test_short_repr(self):
+        big = list(range(10**6))
+        t = time.perf_counter()
+        r = short_repr(big)
+        self.assertLess(time.perf_counter() - t, 0.1)
+        self.assertTrue(r.startswith('[0, 1, 2'))
+        self.assertLessEqual(len(short_repr('x' * 1000, limit=50)), 50)
+        self.assertEqual("'abc'", short_repr('abc'))
+
+        class Bad:
+            def __repr__(self):
+                raise ValueError('nope')
+        self.assertIn('Bad instance', short_repr(Bad()))
+
+    def test_fields(self):
+        self.assertEqual([('x', 1), ('y', 2)], list(fields(Point(1, 2))))
+        self.assertEqual([(0, 'a')], list(fields(('a',))))
+        self.assertFalse(has_fields(3))
+        self.assertFalse(has_fields([]))
+        self.assertTrue(has_fields({'a': 1}))
+
+    def test_page(self):
+        big = list(range(10**6))
+        self.assertEqual([(500000, 500000), (500001, 500001)], page(big, 500000, 2))
+        d = {str(i): i for i in range(10)}
+        self.assertEqual([('8', 8), ('9', 9)], page(d, 8, 5))
+        self.assertEqual(10**6, field_count(big))
+        self.assertEqual(2, field_count(Point(1, 2)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import importlib.util
+import threading
+import time
+import unittest
+import kernel
+from kernel import Kernel, close_unused
+
+class TestKernel(unittest.TestCase):
+    def setUp(self):
+        self.kernel = Kernel()
+        self.addCleanup(self.kernel.shutdown)
+
+    def test_namespace_persists(self):
+        self.assertEqual(('text', 'None'), self.kernel.execute('x = 21'))
+        self.assertEqual(('text', '42'), self.kernel.execute('x * 2'))
+        kind, tb = self.kernel.execute('1 / 0')
+        self.assertEqual('error', kind)
+        self.assertIn('ZeroDivisionError', tb)
+        # impure cells really run again
+        first = self.kernel.execute('import random; random.random()')
+        self.assertNotEqual(first, self.kernel.execute('import random; random.random()'))
+
+    def test_interrupt(self):
+        result = []
+        t = threading.Thread(target=lambda: result.append(self.kernel.execute('while True: pass')))
+        t.start()
+        # signals that land before the loop starts are ignored, so keep at it
+        deadline = time.time() + 10
+        while t.is_alive() and time.time() < deadline:
+            self.kernel.interrupt()
+            t.join(0.1)
+        self.assertEqual('error', result[0][0])
+        self.assertIn('KeyboardInterrupt', result[0][1])
+        self.assertEqual(('text', '2'), self.kernel.execute('1 + 1'))
+
+    def test_crash_and_restart(self):
+        self.kernel.execute('x = 1')
+        kind, msg = self.kernel.execute('import os; os._exit(3)')
+        self.assertEqual(('error', 'kernel died (exit code 3)\n'), (kind, msg))
+        # comes back up with a fresh namespace
+        self.assertEqual('error', self.kernel.execute('x')[0])
+        self.kernel.execute('x = 1')
+        self.kernel.restart()
+        self.assertIn('NameError', self.kernel.execute('x')[1])
+
+    def test_stream(self):
+        rings = []
+        kind, _ = self.kernel.execute(
+            's = stream(4)\n'
+            'for i in range(6):\n'
+            '    s.push(i / 2)\n', key='cell', on_stream=rings.append)
+        self.assertEqual('text', kind)
+        self.assertEqual(1, len(rings))
+        self.assertEqual(6, rings[0].count)
+        self.assertEqual([1.0, 1.5, 2.0, 2.5], rings[0].values())
+        self.assertEqual([2.5], rings[0].values(5))
+        # run again, the stream has to be there again
+        self.kernel.execute('s = stream(4)\nfor i in range(6):\n    s.push(i / 2)\n',
+                            key='cell', on_stream=rings.append)
+        self.assertEqual(2, len(rings))
+        for ring in rings:
+            ring.close()
+
+    def test_profile(self):
+        self.kernel.execute(
+            'import time\n'
+            'def spin(seconds):\n'
+            '    end = time.perf_counter() + seconds\n'
+            '    while time.perf_counter() < end:\n'
+            '        pass\n', key='a', version=1)
+        profiles = []
+        self.kernel.execute('x = 1\nspin(0.3)\n', key='b', version=7,
+                            on_profile=lambda *args: profiles.append(args))
+        (samples, cells, files), = profiles
+        self.assertGreater(samples, 5)
+        # the line calling spin, and the loop in the cell that defined it,
+        # each with the version of the cell that ran
+        self.assertEqual(7, cells['b'][0])
+        self.assertGreater(cells['b'][1][2], samples / 2)
+        self.assertNotIn(1, cells['b'][1])
+        version, lines = cells['a']
+        self.assertEqual(1, version)
+        self.assertGreater(lines[4] + lines.get(5, 0), samples / 2)
+
+        # a cell with the same source is told apart
+        profiles.clear()
+        self.kernel.execute('x = 1\nspin(0.1)\n', key='c', version=1,
+                            on_profile=lambda *args: profiles.append(args))
+        self.assertEqual({'a', 'c'}, set(profiles[0][1]))
+
+        # once a is edited, the spin it defined before doesn't line up with it
+        self.kernel.execute('pass', key='a', version=2)
+        profiles.clear()
+        self.kernel.execute('x = 1\nspin(0.1)\n', key='b', version=7,
+                            on_profile=lambda *args: profiles.append(args))
+        self.assertEqual({'b'}, set(profiles[0][1]))
+
+        self.kernel.profile_interval = None
+        profiles.clear()
+        self.kernel.execute('spin(0.1)', on_profile=lambda *args: profiles.append(args))
+        self.assertEqual([], profiles)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') is None, 'needs numpy')
+    def test_array_released(self):
+        kind, arr = self.kernel.execute('import numpy as np\nnp.arange(6).reshape(2, 3)')
+        self.assertEqual('array', kind)
+        self.assertEqual([[0, 1, 2], [3, 4, 5]], arr.tolist())
+        del arr
+        close_unused()
+        self.assertEqual([], kernel._closing)
+
+    @unittest.skipIf(importlib.util.find_spec('matplotlib') is None, 'needs matplotlib')
+    def test_replaced_plot_stays_mapped(self):
+        kind, small = self.kernel.execute('plt.plot([1, 2])', key='p', dpi=20)
+        self.assertEqual('image', kind)
+        before = small.copy()
+        # too big for the old block, so this one comes in a new block
+        kind, big = self.kernel.execute('plt.plot([1, 2])', key='p', dpi=80)
+        self.assertGreater(big.nbytes, small.nbytes)
+        close_unused()
+        # still mapped, small views it (as a Plot's image would)
+        self.assertTrue((small == before).all())
+        del small
+        close_unused()
+        self.assertEqual([], kernel._closing)
+        self.assertTrue(big.any())
+
+if __name__ == '__main__':
+    unittest.main()
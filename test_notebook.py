@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from notebook import NotebookStore
+
+class TestNotebookStore(unittest.TestCase):
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.path = os.path.join(d.name, 'nb.goggles')
+
+    def test_round_trip(self):
+        store = NotebookStore(self.path)
+        out = store.put_output({'a': [1, 2]})
+        text = store.put_output('x' * 10000)
+        self.assertEqual(out, store.put_output({'a': [1, 2]}))
+        source = '# a comment\nx = 1  # kept\n\n'
+        self.assertEqual(2, store.save([('c1', source, out), ('c2', 'y', text)]))
+        store.close()
+
+        store = NotebookStore(self.path)
+        cells = store.cells()
+        self.assertEqual([('c1', source, out), ('c2', 'y', text)], cells)
+        self.assertEqual({'a': [1, 2]}, store.output(cells[0].output))
+        self.assertEqual('x' * 10000, store.output(cells[1].output))
+        # compressed
+        size, = store._db.execute('select length(data) from outputs where hash = ?', (text,)).fetchone()
+        self.assertLess(size, 1000)
+        store.close()
+
+    def test_only_changed_cells_written(self):
+        store = NotebookStore(self.path)
+        cells = [(f'c{i}', f'x{i} = {i}', None) for i in range(100)]
+        self.assertEqual(100, store.save(cells))
+        cells[50] = ('c50', 'x50 = 0', store.put_output(0))
+        self.assertEqual(1, store.save(cells))
+        del cells[10]
+        cells.append(('new', 'z', None))
+        self.assertEqual(1, store.save(cells))
+        self.assertEqual(0, store.save(cells))
+        # inserting or moving a cell doesn't touch the ones after it
+        cells.insert(0, ('top', 'y = 1', None))
+        self.assertEqual(1, store.save(cells))
+        cells.append(cells.pop(1))
+        self.assertEqual(0, store.save(cells))
+        store.close()
+
+        store = NotebookStore(self.path)
+        self.assertEqual(cells, [tuple(c) for c in store.cells()])
+        # outputs nobody refers to anymore get dropped
+        store.save([])
+        self.assertEqual(0, store._db.execute('select count(*) from outputs').fetchone()[0])
+        store.close()
+
+    def test_unpicklable(self):
+        store = NotebookStore(self.path)
+        h = store.put_output(lambda: 1)
+        self.assertIn('lambda', store.output(h))
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
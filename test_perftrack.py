@@ -0,0 +1,88 @@
+import time
+import tracemalloc
+import unittest
+from perftrack import measure, flame, label, sparkline, format_run, PerfHistory, Run
+
+def leaf():
+    return sum(range(20000))
+
+def middle():
+    return leaf() + leaf()
+
+def outer():
+    return middle() + leaf()
+
+class TestMeasure(unittest.TestCase):
+    def test_measure(self):
+        def work():
+            data = bytearray(10 * 1024 * 1024)
+            del data
+            time.sleep(0.05)
+            return 'done'
+        result, run = measure(work, memory=True)
+        self.assertEqual('done', result)
+        self.assertGreaterEqual(run.wall, 0.05)
+        self.assertLess(run.cpu, run.wall)
+        self.assertGreaterEqual(run.peak, 10 * 1024 * 1024)
+        self.assertIsNone(run.profile)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIn('peak 10', format_run(run))
+
+        _, run = measure(work)
+        self.assertIsNone(run.peak)
+        self.assertNotIn('peak', format_run(run))
+
+    def test_exception(self):
+        def fail():
+            raise ValueError
+        with self.assertRaises(ValueError):
+            measure(fail, memory=True)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_flame(self):
+        _, run = measure(outer, profile=True)
+        rects = flame(run.profile, min_fraction=0)
+        names = {func[2] for _, _, _, func in rects}
+        self.assertTrue({'outer', 'middle', 'leaf'} <= names)
+        by_name = {}
+        for depth, start, width, func in rects:
+            by_name.setdefault(func[2], []).append((depth, start, width))
+        (outer_depth, outer_start, outer_width), = by_name['outer']
+        self.assertGreater(outer_width, 0.5)
+        (middle_depth, middle_start, middle_width), = by_name['middle']
+        self.assertEqual(outer_depth + 1, middle_depth)
+        # leaf is called from both outer and middle
+        self.assertEqual({outer_depth + 1, middle_depth + 1}, {d for d, _, _ in by_name['leaf']})
+        for depth, start, width, _ in rects:
+            self.assertGreaterEqual(start, 0)
+            self.assertLessEqual(start + width, 1 + 1e-9)
+        outer_func = next(func for _, _, _, func in rects if func[2] == 'outer')
+        self.assertEqual('outer (test_perftrack.py:12)', label(outer_func))
+        self.assertEqual([], flame({}))
+
+class TestSparkline(unittest.TestCase):
+    def test_sparkline(self):
+        self.assertEqual('', sparkline([]))
+        self.assertEqual('▁▁', sparkline([3, 3]))
+        self.assertEqual('▁▅█', sparkline([1, 4.5, 7]))
+
+class TestPerfHistory(unittest.TestCase):
+    def test_history(self):
+        history = PerfHistory()
+        for i in range(5):
+            history.record('a', 'v1', Run(i, i / 10, i / 20, i * 100))
+        history.record('a', 'v2', Run(10, 1.0, 0.5, None, {('f.py', 1, 'f'): (1, 1, 0.5, 1.0, {})}))
+        history.record('b', 'v1', Run(11, 2.0, 1.0, 0))
+
+        self.assertEqual([0.0, 0.1, 0.2, 0.3, 0.4, 1.0], [r.wall for r in history.runs('a')])
+        self.assertEqual([0.3, 0.4], [r.wall for r in history.runs('a', 'v1', limit=2)])
+        self.assertIsNone(history.runs('a')[-1].profile)
+        latest = history.latest('a')
+        self.assertEqual({('f.py', 1, 'f'): (1, 1, 0.5, 1.0, {})}, latest.profile)
+        self.assertIsNone(history.latest('a', 'v1').profile)
+        self.assertEqual(400, history.latest('a', 'v1').peak)
+        self.assertIsNone(history.latest('c'))
+        history.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+import piece_table
 from piece_table import PieceTable
 from hypothesis import given, example
 import hypothesis.strategies as st
@@ -47,6 +51,247 @@ class TestPieceTable(unittest.TestCase):
         p.delete(0, 1)
         self.assertEqual('', p.as_str(), f'{p._table=} {p.original=} {p._add=}')
 
+    def test_out_of_bounds(self):
+        p = PieceTable('abc')
+        with self.assertRaises(ValueError):
+            p.insert('x', 4)
+        with self.assertRaises(ValueError):
+            p.insert('x', -1)
+        with self.assertRaises(ValueError):
+            p.delete(2, 2)
+
+    def test_typing_extends_last_piece(self):
+        p = PieceTable('ab')
+        for i, c in enumerate('hello'):
+            p.insert(c, 1 + i)
+        self.assertEqual('ahellob', p.as_str())
+        self.assertEqual(3, len(p._table))
+
+    def test_version_and_cached_str(self):
+        p = PieceTable('abc')
+        v = p.version
+        s = p.as_str()
+        self.assertIs(s, p.as_str())
+        self.assertEqual(v, p.version)
+
+        p.insert('', 1)
+        p.delete(1, 0)
+        self.assertEqual(v, p.version)
+
+        p.insert('x', 1)
+        self.assertGreater(p.version, v)
+        self.assertEqual('axbc', p.as_str())
+        v = p.version
+        p.delete(0, 1)
+        self.assertGreater(p.version, v)
+        self.assertEqual('xbc', p.as_str())
+
+    @given(st.data())
+    def test_substr(self, data):
+        t = data.draw(st.text(), label='initial buffer')
+        p = PieceTable(t)
+        for _ in range(data.draw(st.integers(min_value=0, max_value=10))):
+            _, sub, i = data.draw(substr_insert_input(t))
+            t = insert_str(t, i, sub)
+            p.insert(sub, i)
+        start = data.draw(st.integers(min_value=0, max_value=len(t)))
+        end = data.draw(st.integers(min_value=start, max_value=len(t)))
+        self.assertEqual(t[start:end], p.substr(start, end))
+        self.assertEqual(t, ''.join(p.iter_chunks()))
+
+    def test_add_buffer_spans_chunks(self):
+        with mock.patch.object(piece_table._AddBuffer, 'CHUNK_SIZE', 4):
+            p = PieceTable('')
+            t = ''
+            for s in ('ab', 'cdefghij', 'k', 'lmnopq'):
+                p.insert(s, len(t) // 2)
+                t = insert_str(t, len(t) // 2, s)
+            self.assertEqual(t, p.as_str())
+            self.assertEqual(t[3:13], p.substr(3, 13))
+
+    @given(st.text(), st.data())
+    def test_from_file(self, t, data):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'f.txt')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(t)
+
+            # small blocks so multi-byte characters straddle block boundaries
+            with mock.patch.object(piece_table._MappedBuffer, 'BLOCK_SIZE', 5):
+                p = PieceTable.from_file(path)
+            self.assertEqual(t, p.as_str())
+            self.assertEqual(t.count('\n'), p.newline_count())
+
+            start = data.draw(st.integers(min_value=0, max_value=len(t)))
+            end = data.draw(st.integers(min_value=start, max_value=len(t)))
+            self.assertEqual(t[start:end], p.substr(start, end))
+
+            _, sub, i = data.draw(substr_insert_input(t))
+            p.insert(sub, i)
+            self.assertEqual(insert_str(t, i, sub), p.as_str())
+
+    def test_from_file_not_utf8(self):
+        data = b'ab\xffc\n\xe9\n' + '\u00e9x'.encode() + b'\x80' * 8
+        t = data.decode('utf-8', 'replace')
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'f.txt')
+            with open(path, 'wb') as f:
+                f.write(data)
+            for block_size in (4, 5, 1 << 16):
+                with mock.patch.object(piece_table._MappedBuffer, 'BLOCK_SIZE', block_size):
+                    p = PieceTable.from_file(path)
+                self.assertEqual(t, p.as_str())
+                self.assertEqual(2, p.newline_count())
+                self.assertEqual(t[2:9], p.substr(2, 9))
+                p.close()
+                self.assertTrue(p._buffers['original']._map.closed)
+
+    def test_undo_coalesces_typing(self):
+        p = PieceTable('ab')
+        for i, c in enumerate('xyz'):
+            p.insert(c, 1 + i)
+        p.delete(0, 1)
+        self.assertEqual('xyzb', p.as_str())
+
+        self.assertEqual(1, p.undo())
+        self.assertEqual('axyzb', p.as_str())
+        self.assertEqual(1, p.undo())
+        self.assertEqual('ab', p.as_str())
+        self.assertIsNone(p.undo())
+
+        self.assertEqual(4, p.redo())
+        self.assertEqual('axyzb', p.as_str())
+        p.insert('!', 0)
+        self.assertIsNone(p.redo())
+        self.assertEqual('!axyzb', p.as_str())
+
+    @given(st.data())
+    def test_apply_edits(self, data):
+        t = data.draw(st.text(), label='initial buffer')
+        p = PieceTable(t)
+        edits = []
+        for _ in range(data.draw(st.integers(min_value=0, max_value=30))):
+            if data.draw(st.booleans()):
+                _, sub, i = data.draw(substr_insert_input(t))
+                edits.append(('insert', i, sub))
+                t = insert_str(t, i, sub)
+            else:
+                _, start, length = data.draw(substr_delete_input(t))
+                edits.append(('delete', start, length))
+                t = delete_str(t, start, length)
+
+        original, version = p.as_str(), p.version
+        p.apply_edits(edits)
+        self.assertEqual(t, p.as_str())
+        self.assertLessEqual(p.version, version + 1)
+        if t != original:
+            p.undo()
+            self.assertEqual(original, p.as_str())
+
+    @given(st.data())
+    def test_replace_ranges(self, data):
+        t = data.draw(st.text(), label='initial buffer')
+        p = PieceTable(t)
+        bounds = sorted(data.draw(st.lists(st.integers(min_value=0, max_value=len(t)), max_size=10)))
+        ranges = [(bounds[i], bounds[i+1], data.draw(st.text(max_size=3)))
+                  for i in range(0, len(bounds) - 1, 2)]
+
+        expected = t
+        for start, end, sub in reversed(ranges):
+            expected = expected[:start] + sub + expected[end:]
+
+        p.replace_ranges(ranges)
+        self.assertEqual(expected, p.as_str())
+        if expected != t:
+            p.undo()
+            self.assertEqual(t, p.as_str())
+            p.redo()
+            self.assertEqual(expected, p.as_str())
+
+    def test_replace_ranges_rejects_overlap(self):
+        p = PieceTable('abcdef')
+        with self.assertRaises(ValueError):
+            p.replace_ranges([(0, 3, 'x'), (2, 4, 'y')])
+        p.replace(1, 3, 'XY\n')
+        self.assertEqual('aXY\ndef', p.as_str())
+
+    def test_apply_edits_merges_typing_and_backspacing(self):
+        p = PieceTable('abc')
+        p.apply_edits([('insert', 1, 'x'), ('insert', 2, 'y'), ('insert', 3, 'z'),
+                       ('delete', 3, 1), ('delete', 2, 1)])
+        self.assertEqual('axbc', p.as_str())
+        self.assertEqual(1, len(p._undo))
+        p.undo()
+        self.assertEqual('abc', p.as_str())
+
+    @given(st.data())
+    def test_undo_redo(self, data):
+        t = data.draw(st.text(), label='initial buffer')
+        p = PieceTable(t)
+        states = [t]
+        for _ in range(data.draw(st.integers(min_value=0, max_value=30))):
+            if data.draw(st.booleans()):
+                _, sub, i = data.draw(substr_insert_input(states[-1]))
+                p.insert(sub, i)
+                states.append(insert_str(states[-1], i, sub))
+            else:
+                _, start, length = data.draw(substr_delete_input(states[-1]))
+                p.delete(start, length)
+                states.append(delete_str(states[-1], start, length))
+
+        while p.undo() is not None:
+            self.assertIn(p.as_str(), states)
+        self.assertEqual(states[0], p.as_str())
+        while p.redo() is not None:
+            self.assertIn(p.as_str(), states)
+        self.assertEqual(states[-1], p.as_str())
+
+    @given(st.data())
+    def test_compact(self, data):
+        t = data.draw(st.text(), label='initial buffer')
+        p, compacted = PieceTable(t), PieceTable(t)
+        for _ in range(data.draw(st.integers(min_value=0, max_value=20))):
+            t = p.as_str()
+            if data.draw(st.booleans()):
+                _, sub, i = data.draw(substr_insert_input(t))
+                p.insert(sub, i)
+                compacted.insert(sub, i)
+            else:
+                _, start, length = data.draw(substr_delete_input(t))
+                p.delete(start, length)
+                compacted.delete(start, length)
+            if data.draw(st.booleans()):
+                p.undo()
+                compacted.undo()
+
+        version, pieces = compacted.version, len(compacted._table)
+        compacted.compact()
+        self.assertEqual(p.as_str(), compacted.as_str())
+        self.assertEqual(version, compacted.version)
+        self.assertLessEqual(len(compacted._table), pieces)
+        self.assertEqual(0, compacted.stats()['dead_add'])
+
+        # the undo history still works
+        while p.redo() is not None:
+            compacted.redo()
+            self.assertEqual(p.as_str(), compacted.as_str())
+        while p.undo() is not None:
+            compacted.undo()
+            self.assertEqual(p.as_str(), compacted.as_str())
+        self.assertIsNone(compacted.undo())
+
+    def test_stats_and_compaction_policy(self):
+        p = PieceTable('x' * 10)
+        p.set_compaction_policy(max_pieces=20)
+        for i in range(50):
+            p.insert('ab', i + 1)
+            p.delete(i + 1, 1)
+        self.assertEqual('x' + 'b' * 50 + 'x' * 9, p.as_str())
+        stats = p.stats()
+        self.assertLessEqual(stats['pieces'], 40)
+        self.assertEqual(len(p), stats['length'])
+        self.assertEqual(50, stats['live_add'])
+
     @given(st.data())
     def test_series_of_inserts_and_deletes(self, data):
         nsteps = data.draw(st.integers(min_value=0, max_value=100), label='number of operations to perform')
@@ -0,0 +1,64 @@
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from reloader import ModuleGraph, Debouncer
+
+class TestModuleGraph(unittest.TestCase):
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+        sys.path.insert(0, self.dir)
+        self.addCleanup(sys.path.remove, self.dir)
+        self.write('rl_b.py', 'v = 1\n')
+        self.write('rl_pkg/__init__.py', '')
+        self.write('rl_pkg/sub.py', 'from rl_b import v\n')
+        self.write('rl_a.py', 'from rl_pkg import sub\nw = sub.v * 10\n')
+        self.write('rl_other.py', 'import json\n')
+        for name in ('rl_a', 'rl_b', 'rl_pkg', 'rl_pkg.sub', 'rl_other'):
+            self.addCleanup(sys.modules.pop, name, None)
+
+        self.graph = ModuleGraph()
+        self.graph.install()
+        self.addCleanup(self.graph.uninstall)
+        importlib.invalidate_caches()
+        exec('import rl_a, rl_other', {'__name__': 'cell'})
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        # make sure the mtime changes even within the filesystem's resolution
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        return path
+
+    def test_reload(self):
+        self.assertEqual(['rl_b', 'rl_pkg.sub', 'rl_a'],
+                         self.graph.reload_order({'rl_b'}))
+        # library modules are never reloaded themselves
+        self.assertEqual(['rl_other'], self.graph.reload_order({'json'}))
+
+        path = self.write('rl_b.py', 'v = 2\n')
+        self.assertEqual(['rl_b', 'rl_pkg.sub', 'rl_a'], self.graph.reload([path]))
+        self.assertEqual(20, sys.modules['rl_a'].w)
+        self.assertEqual([], self.graph.reload([os.path.join(self.dir, 'nothing.py')]))
+
+class TestDebouncer(unittest.TestCase):
+    def test_coalesces(self):
+        calls = []
+        done = threading.Event()
+        d = Debouncer(0.05, lambda keys: (calls.append(keys), done.set()))
+        for key in 'abab':
+            d.add(key)
+        self.assertTrue(done.wait(5))
+        time.sleep(0.1)
+        self.assertEqual([{'a', 'b'}], calls)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+from sampler import Sampler
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:  # hot line
+        pass
+
+def outer(seconds):
+    spin(seconds)  # calls the hot line
+
+class TestSampler(unittest.TestCase):
+    def test_samples_calling_thread(self):
+        with Sampler(interval=0.001) as sampler:
+            outer(0.3)
+        self.assertGreater(sampler.samples, 10)
+        lines = sampler.lines(__file__)
+        hot = spin.__code__.co_firstlineno + 2
+        calling = outer.__code__.co_firstlineno + 1
+        self.assertGreater(lines[hot], sampler.samples / 2)
+        self.assertGreater(lines[calling], sampler.samples / 2)
+        self.assertEqual(lines, sampler.by_file()[__file__])
+
+        # stopped, so nothing more is counted
+        samples = sampler.samples
+        spin(0.05)
+        self.assertEqual(samples, sampler.samples)
+
+        # starting again adds up
+        with sampler:
+            spin(0.1)
+        self.assertGreater(sampler.samples, samples)
+        sampler.clear()
+        self.assertEqual(({}, 0), (sampler.lines(__file__), sampler.samples))
+
+    def test_other_thread(self):
+        t = threading.Thread(target=spin, args=(0.3,))
+        t.start()
+        with Sampler(interval=0.001, thread_id=t.ident) as sampler:
+            t.join()
+            spin(0.05)
+        lines = sampler.lines(__file__)
+        self.assertIn(spin.__code__.co_firstlineno + 2, lines)
+        self.assertNotIn(outer.__code__.co_firstlineno + 1, lines)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import re
+import unittest
+from buffer import Buffer
+from search import SearchIndex
+from hypothesis import given
+import hypothesis.strategies as st
+
+def literal_matches(s, pattern):
+    return [(i, i + len(pattern)) for i in range(len(s)) if s.startswith(pattern, i)]
+
+def regex_matches(s, pattern):
+    found = []
+    base = 0
+    for line in s.split('\n'):
+        found += [(base + m.start(), base + m.end()) for m in re.finditer(pattern, line) if m.end() > m.start()]
+        base += len(line) + 1
+    return found
+
+def fragmented_buffer(data, alphabet):
+    '''a buffer built up by random inserts, so its text is spread over many pieces'''
+    t = ''
+    b = Buffer('')
+    for _ in range(data.draw(st.integers(min_value=0, max_value=15))):
+        i = data.draw(st.integers(min_value=0, max_value=len(t)))
+        sub = data.draw(st.text(alphabet=alphabet, max_size=4))
+        t = t[:i] + sub + t[i:]
+        b.insert(sub, i)
+    return t, b
+
+class TestSearch(unittest.TestCase):
+    @given(st.data())
+    def test_finditer_across_pieces(self, data):
+        t, b = fragmented_buffer(data, 'ab\n')
+        pattern = data.draw(st.text(alphabet='ab\n', min_size=1, max_size=3))
+        self.assertEqual(literal_matches(t, pattern), list(b.search(pattern)))
+        self.assertEqual(regex_matches(t, 'a+b?'), list(b.search('a+b?', regex=True)))
+
+    def test_finditer_range(self):
+        b = Buffer('abcabcabc')
+        self.assertEqual([(3, 6)], list(b.search('abc', start=2, end=7)))
+
+    @given(st.data(), st.booleans())
+    def test_index_follows_edits(self, data, regex):
+        t, b = fragmented_buffer(data, 'ab\n')
+        if regex:
+            pattern, expected = 'ab*', regex_matches
+        else:
+            pattern, expected = data.draw(st.text(alphabet='ab\n', min_size=1, max_size=3)), literal_matches
+        index = SearchIndex(b, pattern, regex=regex)
+
+        for _ in range(data.draw(st.integers(min_value=0, max_value=10))):
+            op = data.draw(st.sampled_from(['insert', 'delete', 'replace_all', 'undo', 'query']))
+            if op == 'insert':
+                i = data.draw(st.integers(min_value=0, max_value=len(t)))
+                sub = data.draw(st.text(alphabet='ab\n', max_size=4))
+                b.insert(sub, i)
+            elif op == 'delete':
+                start = data.draw(st.integers(min_value=0, max_value=len(t)))
+                b.delete(start, data.draw(st.integers(min_value=0, max_value=len(t) - start)))
+            elif op == 'replace_all':
+                b.replace_all('a', data.draw(st.text(alphabet='ab\n', max_size=2)))
+            elif op == 'undo':
+                b.undo()
+            else:
+                start = data.draw(st.integers(min_value=0, max_value=len(t)))
+                self.assertEqual([m for m in expected(t, pattern) if m[0] >= start],
+                                 list(index.matches(start)))
+            t = b.as_str()
+
+        self.assertEqual(expected(t, pattern), list(index))
+        self.assertEqual(len(expected(t, pattern)), len(index))
+
+    def test_index_close(self):
+        b = Buffer('aaa')
+        index = SearchIndex(b, 'a')
+        index.close()
+        b.insert('a', 0)
+        self.assertEqual(3, len(index))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,20 @@
 import contextlib
+import os
+import sys
 import glfw  # type: ignore
 import skia  # type: ignore
 import traceback
+import weakref
 import random
 import math
-import ast
-import importlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from OpenGL import GL  # type: ignore
-from typing import List
-from functools import lru_cache, wraps
-import numpy as np  # type: ignore
-import matplotlib  # type: ignore
+from typing import List, Optional
+from functools import lru_cache
+import arrayview
 from buffer import Buffer
+from executor import CellExecutor
+from kernel import Kernel, close_unused
 
 font = skia.Font(skia.Typeface('Liberation Mono'), 14)
 line_height = font.getSpacing()
@@ -23,6 +25,36 @@ col_width = font.getWidths([ord('x')])[0]
 class Cell:
     input: Buffer
     output: object
+    # LivePlots for the stream()s the last run opened
+    streams: list = field(default_factory=list)
+    # the file it was opened from, if it was
+    path: Optional[str] = None
+    # (input version, {line: samples}) from the last profiled run that ran
+    # any of it, the version being the one whose lines were sampled. Lines
+    # are counted from 1.
+    heat: tuple = (None, {})
+
+
+@dataclass
+class Plot:
+    # wraps the pixels the kernel drew into, without copying them
+    image: skia.Image
+    # image pixels per screen pixel, plots are drawn at the display's DPI
+    scale: float
+    # the array image wraps. It keeps the shared memory behind it mapped,
+    # the image on its own doesn't
+    pixels: object = None
+
+    def close(self):
+        '''lets go of the pixels, on the thread that draws'''
+        self.image = self.pixels = None
+        close_unused()
+
+    def height(self):
+        return self.image.height() / self.scale
+
+    def width(self):
+        return self.image.width() / self.scale
 
 
 target_scroll = [0, 0]
@@ -32,8 +64,12 @@ def clamp(l, u, v):
     return max(min(v, u), l)
 
 
+# total rows taken up by all the cells, as of the last frame
+content_lines = 100
+
+
 def scroll(x, y):
-    lines = 100  # FIXME
+    lines = content_lines
     target_scroll[0] = x
     target_scroll[1] = y
 
@@ -49,10 +85,137 @@ def scroll_to_line(i):
 
 
 input_paint = skia.Paint(AntiAlias=True, Color=skia.ColorBLACK)
+live_plot_paint = skia.Paint(AntiAlias=True, Color=skia.ColorBLUE, Style=skia.Paint.kStroke_Style)
 output_paint = skia.Paint(AntiAlias=True, Color=skia.ColorGRAY)
+running_paint = skia.Paint(Color=skia.Color(255, 165, 0))
+queued_paint = skia.Paint(Color=skia.ColorLTGRAY)
+# from barely sampled to the hottest line
+heat_paints = [skia.Paint(Color=skia.Color(230, 60, 0, 40 + 215 * i // 7)) for i in range(8)]
+HEAT_GUTTER_WIDTH = 6
 
 WIDTH, HEIGHT = 800, 600
 
+LIVE_PLOT_HEIGHT = 120
+
+
+class LivePlot:
+    '''A stream() from a running cell, drawn as a line onto its own surface.
+       Samples that arrive are drawn onto what's already there; it's only
+       redrawn from scratch when the y-range has to grow, or once the ring
+       buffer is full and every new sample shifts the rest left.'''
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.surface = skia.Surface(WIDTH, LIVE_PLOT_HEIGHT)
+        self.surface.getCanvas().clear(skia.ColorWHITE)
+        self.image = self.surface.makeImageSnapshot()
+        self.drawn = 0  # samples drawn so far
+        self.lo = self.hi = None
+
+    def rows(self):
+        return math.ceil(LIVE_PLOT_HEIGHT / line_height)
+
+    def _draw(self, canvas, first, start, values):
+        '''values are samples start, start + 1, ..., first is the one at the
+           left edge'''
+        path = skia.Path()
+        pen_down = False
+        for i, v in enumerate(values, start - first):
+            if not math.isfinite(v):
+                pen_down = False
+                continue
+            x = i * WIDTH / self.ring.capacity
+            y = (LIVE_PLOT_HEIGHT - 1) * (self.hi - v) / (self.hi - self.lo)
+            if pen_down:
+                path.lineTo(x, y)
+            else:
+                path.moveTo(x, y)
+                pen_down = True
+        canvas.drawPath(path, live_plot_paint)
+
+    def update(self):
+        '''draws whatever arrived since the last call. Returns whether
+           anything did.'''
+        count = self.ring.count
+        if count == self.drawn:
+            return False
+        first = max(0, count - self.ring.capacity)
+        # start from the last point drawn, to join the line up
+        start = max(self.drawn - 1, first)
+        new = [v for v in self.ring.values(start, count) if math.isfinite(v)]
+        canvas = self.surface.getCanvas()
+        if first > 0 or (new and (self.lo is None or min(new) < self.lo or max(new) > self.hi)):
+            start = first
+            values = self.ring.values(first, count)
+            finite = [v for v in values if math.isfinite(v)] or [0.0]
+            lo, hi = min(finite), max(finite)
+            pad = (hi - lo) * 0.1 or 1.0
+            self.lo, self.hi = lo - pad, hi + pad
+            canvas.clear(skia.ColorWHITE)
+        else:
+            values = self.ring.values(start, count)
+        if self.lo is not None:
+            self._draw(canvas, first, start, values)
+        self.drawn = count
+        self.image = self.surface.makeImageSnapshot()
+        return True
+
+    def close(self):
+        self.ring.close()
+
+
+# TextBlobs for lines that have been on screen. Input blobs are keyed by
+# buffer and thrown away when its version changes, output blobs by cell and
+# thrown away when the output changes.
+input_blobs = weakref.WeakKeyDictionary()  # Buffer -> (version, {line: TextBlob})
+output_blobs = {}  # id(cell) -> (output, output lines, {line: TextBlob})
+
+
+def visible_range(first_line, nlines, top):
+    '''the lines of a block starting at row first_line that fall inside the
+       viewport, whose top edge is at y = top'''
+    lo = max(0, math.floor(top / line_height) + 1 - first_line)
+    hi = min(nlines, math.ceil((top + HEIGHT) / line_height) + 1 - first_line)
+    return range(lo, hi)
+
+
+def draw_blobs(canvas, blobs, get_text, first_line, lines, paint):
+    for i in lines:
+        if i not in blobs:
+            text = get_text(i)
+            blobs[i] = skia.TextBlob.MakeFromString(text, font) if text else None
+        if blobs[i] is not None:
+            canvas.drawTextBlob(blobs[i], 0, line_height * (first_line + i), paint)
+
+
+def output_rows(c):
+    '''the number of rows a cell's output takes up'''
+    if isinstance(c.output, str):
+        return len(cell_output_blobs(c)[0])
+    elif isinstance(c.output, Plot):
+        return math.ceil(c.output.height() / line_height)
+    return 0
+
+
+def set_output(c, output):
+    old, c.output = c.output, output
+    if isinstance(old, Plot) and old is not output:
+        old.close()
+
+
+def cell_output_blobs(c):
+    entry = output_blobs.get(id(c))
+    if entry is None or entry[0] is not c.output:
+        entry = output_blobs[id(c)] = (c.output, c.output.split('\n'), {})
+    return entry[1:]
+
+
+def cell_input_blobs(c):
+    entry = input_blobs.get(c.input)
+    if entry is None or entry[0] != c.input.version:
+        entry = input_blobs[c.input] = (c.input.version, {})
+    return entry[1]
+
 
 @contextlib.contextmanager
 def glfw_window():
@@ -109,26 +272,17 @@ class Cursor:
             self.column = c
 
 
-def exec_block(block, context_globals=None):
-    if context_globals is None:
-        context_globals = {}
-
-    if isinstance(block.body[-1], ast.Expr):
-        last = ast.Expression(block.body.pop().value)
-
-        exec(compile(block, '<string>', mode='exec'),
-             context_globals)
-        return eval(compile(last, '<string>', mode='eval'),
-                    context_globals)
-    else:
-        exec(compile(block, '<string>', mode='exec'),
-             context_globals)
-        return None
+def is_text_edit(event):
+    '''typed characters, enter and backspace'''
+    return event[0] == 'key_press' and (len(event[1]) == 1 or event[1] in ('enter', 'backspace'))
 
 
 cells: List[Cell] = []
 cells.append(Cell(Buffer(''), 'some output'))
 cells.append(Cell(Buffer('some\nmore\ninput\nhere'), 'some output'))
+# files given on the command line are opened as memory-mapped cells
+for path in sys.argv[1:]:
+    cells.append(Cell(Buffer.from_file(path), '', path=os.path.realpath(path)))
 
 cur_cell = 0
 cursor = Cursor(cells[cur_cell].input)
@@ -149,8 +303,17 @@ with glfw_window() as window:
                    glfw.KEY_LEFT: 'left',
                    glfw.KEY_RIGHT: 'right'}
 
+        # letters only come through here as ctrl combos, otherwise they're
+        # handled by the char callback
+        ctrl_key_map = {glfw.KEY_Z: 'z',
+                        glfw.KEY_Y: 'y',
+                        glfw.KEY_C: 'c',
+                        glfw.KEY_R: 'r'}
+
         if k in key_map and action in (glfw.PRESS, glfw.REPEAT):
             key = key_map[k]
+        elif k in ctrl_key_map and mods & glfw.MOD_CONTROL and action in (glfw.PRESS, glfw.REPEAT):
+            key = ctrl_key_map[k]
         else:  # not a key we handle in the key callback
             return
 
@@ -163,41 +326,101 @@ with glfw_window() as window:
         target_scroll[0] += dx * line_height * 2
         target_scroll[1] += dy * line_height * 2
         scroll(target_scroll[0] + dx * 20, target_scroll[1] + dy * 20)
+        event_pipe.append(('redraw',))
+
+    def refresh_callback(_win):
+        event_pipe.append(('redraw',))
 
     glfw.set_scroll_callback(window, scroll_callback)
+    glfw.set_window_refresh_callback(window, refresh_callback)
     glfw.set_char_callback(window, char_callback)
     glfw.set_key_callback(window, key_callback)
 
-    globs = {}
-    globs['plt'] = importlib.import_module(
-        'matplotlib.pyplot')
-
-    # wrap plt.plot
-    _orig_plot = globs['plt'].plot
-    @wraps(_orig_plot)
-    def wrapped_plot(*args, **kwargs):
-        wrapped_plot.was_called = True
-        return _orig_plot(*args, **kwargs)
+    # cells run in a separate kernel process, the executor's worker thread
+    # just waits on it so the UI stays responsive
+    kernel = Kernel()
+    plot_scale = glfw.get_window_content_scale(window)[0]
+
+    def run_cell(i, source, version):
+        '''runs on the executor's worker thread'''
+        def on_stream(ring):
+            event_pipe.append(('cell_stream', i, ring))
+            glfw.post_empty_event()
+
+        def on_profile(samples, cell_lines, file_lines):
+            event_pipe.append(('cell_profile', cell_lines, file_lines))
+            glfw.post_empty_event()
+
+        kind, value = kernel.execute(source, key=i, dpi=100 * plot_scale,
+                                     on_stream=on_stream, on_profile=on_profile, version=version)
+        if kind == 'image':
+            # the kernel draws cell i's plots into the same shared memory
+            # every time, the image just points at it
+            return Plot(skia.Image.fromarray(value, copy=False), plot_scale, value)
+        if kind == 'array':
+            # only the corner that's shown and the stats are read out of the
+            # shared memory, which then goes straight away
+            text = arrayview.summary(value)
+            del value
+            close_unused()
+            return text
+        return str(value)
+
+    def on_cell_event(i, event, value):
+        # called from the worker thread, so hand it to the main loop
+        event_pipe.append(('cell_event', i, event, value))
+        glfw.post_empty_event()
+
+    executor = CellExecutor(run_cell, on_cell_event, kernel.interrupt)
 
 
     last_frame = 0
+    # set whenever the screen no longer matches the state, i.e. after input,
+    # new output, or while the scroll animation is still settling
+    needs_redraw = True
     with skia_surface(window) as surface:
         while (glfw.get_key(window, glfw.KEY_ESCAPE) != glfw.PRESS
                and not glfw.window_should_close(window)):
 
+            # sleep until there's an event, unless there's a frame to draw,
+            # or check for more live output at (roughly) display rate
+            if needs_redraw:
+                glfw.poll_events()
+            elif any(c.streams and executor.status(i) == 'running' for i, c in enumerate(cells)):
+                glfw.wait_events_timeout(1 / 60)
+            else:
+                glfw.wait_events()
+
             current_frame = glfw.get_time()
             dt = current_frame - last_frame
             last_frame = current_frame
 
-            glfw.poll_events()
+            # == update
+
+            if event_pipe:
+                needs_redraw = True
 
             while event_pipe:
+                if is_text_edit(event_pipe[0]):
+                    # apply all the typing queued up this frame in one batch
+                    edits = []
+                    pos = cursor._pos
+                    while event_pipe and is_text_edit(event_pipe[0]):
+                        _, key = event_pipe.pop(0)
+                        if key == 'backspace':
+                            if pos - 1 >= 0:
+                                edits.append(('delete', pos - 1, 1))
+                                pos -= 1
+                        else:
+                            edits.append(('insert', pos, '\n' if key == 'enter' else key))
+                            pos += 1
+                    cells[cur_cell].input.apply_edits(edits)
+                    cursor._pos = pos
+                    continue
+
                 event_type, *args = event_pipe.pop(0)
                 if event_type == 'key_press':
-                    if args[0] == 'enter':
-                        cells[cur_cell].input.insert('\n', cursor._pos)
-                        cursor._pos += 1
-                    elif args[0] == 'down':
+                    if args[0] == 'down':
                         cursor.line += 1
                     elif args[0] == 'up':
                         cursor.line -= 1
@@ -205,13 +428,6 @@ with glfw_window() as window:
                         cursor.column += 1
                     elif args[0] == 'left':
                         cursor.column -= 1
-                    elif args[0] == 'backspace':
-                        if cursor._pos - 1 >= 0:
-                            cells[cur_cell].input.delete(cursor._pos-1, 1)
-                            cursor._pos -= 1
-                    else:
-                        cells[cur_cell].input.insert(args[0], cursor._pos)
-                        cursor._pos += 1
                 elif event_type == 'key_combo':
                     mod, key = args
                     if mod == 'ctrl' and key == 'up':
@@ -222,36 +438,59 @@ with glfw_window() as window:
                         if cur_cell + 1 < len(cells):
                             cur_cell += 1
                             cursor = Cursor(cells[cur_cell].input)
+                    if mod == 'ctrl' and key in ('z', 'y'):
+                        buf = cells[cur_cell].input
+                        pos = buf.undo() if key == 'z' else buf.redo()
+                        if pos is not None:
+                            cursor._pos = pos
                     if mod == 'ctrl' and key == 'enter':
-                        tree = ast.parse(cells[cur_cell].input.as_str(),
-                                         mode='exec')
-                        try:
-                            globs['plt'].clf()  # clear out plot
-                            globs['plt'].plot = wrapped_plot
-                            wrapped_plot.was_called = False
-                            globs['np'] = importlib.import_module('numpy')
-                            output = exec_block(tree, globs)
-
-                            if wrapped_plot.was_called:
-                                output = globs['plt'].gcf()
-                                output.canvas.draw()
-                                data = np.fromstring(
-                                    output.canvas.tostring_rgb(), dtype=np.uint8, sep='')
-                                data = data.reshape(
-                                    output.canvas.get_width_height()[::-1] + (3,))
-                                data = np.dstack(
-                                    (data, np.ones((data.shape[0], data.shape[1]), dtype=np.uint8) * 255))
-                                cells[cur_cell].output = skia.Image.fromarray(data)
-                            else:
-                                cells[cur_cell].output = str(output)
-                        except:
-                            cells[cur_cell].output = traceback.format_exc()
+                        buf = cells[cur_cell].input
+                        executor.submit(cur_cell, cur_cell, buf.as_str(), buf.version)
+                    if mod == 'ctrl' and key == 'c':
+                        executor.interrupt(cur_cell)
+                    if mod == 'ctrl' and key == 'r':
+                        # fresh namespace, the cells themselves are untouched
+                        kernel.restart()
+                elif event_type == 'cell_event':
+                    i, event, value = args
+                    if event == 'started':
+                        for plot in cells[i].streams:
+                            plot.close()
+                        cells[i].streams = []
+                    elif event == 'done':
+                        set_output(cells[i], value)
+                    elif event == 'error':
+                        set_output(cells[i], ''.join(traceback.format_exception(value)))
+                elif event_type == 'cell_stream':
+                    i, ring = args
+                    cells[i].streams.append(LivePlot(ring))
+                elif event_type == 'cell_profile':
+                    cell_lines, file_lines = args
+                    for i, c in enumerate(cells):
+                        if i in cell_lines:
+                            # stamped with the version that ran, edits since
+                            # hide it
+                            c.heat = cell_lines[i]
+                        elif c.path in file_lines:
+                            # from the file on disk, good until it's edited
+                            c.heat = (c.input.version, file_lines[c.path])
+
+            # pick up live output that's arrived since the last frame
+            for c in cells:
+                for plot in c.streams:
+                    if plot.update():
+                        needs_redraw = True
+
+            # ensure cursor is visible
+            target_scroll[1] = clamp(
+                cursor.line * -line_height, (cursor.line + 2) * -line_height + HEIGHT, target_scroll[1])
+
+            # == draw
+
+            if not needs_redraw:
+                continue
 
             with surface as canvas:
-                # ensure cursor is visible
-                target_scroll[1] = clamp(
-                    cursor.line * -line_height, (cursor.line + 2) * -line_height + HEIGHT, target_scroll[1])
-
                 M = canvas.getTotalMatrix()
                 if abs(target_scroll[1] - M.getTranslateY()) > 2:
                     canvas.translate(
@@ -260,31 +499,69 @@ with glfw_window() as window:
                     canvas.translate(0, target_scroll[1] - M.getTranslateY())
 
                 canvas.clear(skia.Color(255, 255, 255))
+                # only draw what's inside the viewport
+                top = -canvas.getTotalMatrix().getTranslateY()
                 line = 1
-                for c in cells:
+                for i, c in enumerate(cells):
+                    status = executor.status(i)
+                    if status is not None:
+                        # mark running/queued cells in the right margin
+                        canvas.drawRect(skia.Rect.MakeXYWH(
+                            WIDTH - 4, line_height * (line - 1) + 4, 4, line_height * c.input.nlines()),
+                            running_paint if status == 'running' else queued_paint)
+
                     if cursor._buf == c.input:
                         # draw cursor
                         canvas.drawRect(skia.Rect.MakeXYWH(
                             cursor.column * col_width, line_height * (line - 1) + cursor.line * line_height + 4, 2, line_height), input_paint)
 
                     # display input
-                    for l in c.input.as_str().split('\n'):
-                        canvas.drawString(
-                            l, 0, line_height * line, font, input_paint)
-                        line += 1
+                    nlines = c.input.nlines()
+                    draw_blobs(canvas, cell_input_blobs(c), c.input.line_text, line,
+                               visible_range(line, nlines, top), input_paint)
+
+                    # heat gutter, left of the status margin. Dropped once
+                    # the input's edited, the lines wouldn't match anymore
+                    version, heat = c.heat
+                    if heat and version == c.input.version:
+                        hottest = max(heat.values())
+                        for j in visible_range(line, nlines, top):
+                            n = heat.get(j + 1)
+                            if n:
+                                canvas.drawRect(skia.Rect.MakeXYWH(
+                                    WIDTH - 6 - HEAT_GUTTER_WIDTH, line_height * (line - 1 + j) + 4,
+                                    HEAT_GUTTER_WIDTH, line_height),
+                                    heat_paints[n * (len(heat_paints) - 1) // hottest])
+                    line += nlines
+
+                    # display live output
+                    for plot in c.streams:
+                        if visible_range(line, plot.rows(), top):
+                            canvas.drawImage(plot.image, 0, line_height * line)
+                        line += plot.rows()
 
                     # display output
+                    rows = output_rows(c)
                     if isinstance(c.output, str):
-                        for l in c.output.split('\n'):
-                            canvas.drawString(
-                                l, 0, line_height * line, font, output_paint)
-                            line += 1
-                    elif isinstance(c.output, skia.Image):
-                        canvas.drawImage(c.output, 0, line_height * line, None)
-                        line += np.ceil(c.output.height() / line_height)
+                        out_lines, blobs = cell_output_blobs(c)
+                        draw_blobs(canvas, blobs, out_lines.__getitem__, line,
+                                   visible_range(line, rows, top), output_paint)
+                    elif isinstance(c.output, Plot) and visible_range(line, rows, top):
+                        canvas.drawImageRect(c.output.image, skia.Rect.MakeXYWH(
+                            0, line_height * line, c.output.width(), c.output.height()))
+                    line += rows
+                content_lines = line
+
+                # keep drawing frames until the scroll animation settles
+                needs_redraw = abs(target_scroll[1] - canvas.getTotalMatrix().getTranslateY()) > 1
             surface.flushAndSubmit()
             glfw.swap_buffers(window)
 
+    executor.shutdown()
+    kernel.shutdown()
+    for c in cells:
+        c.input.close()
+
 
 '''
 Main TODO items